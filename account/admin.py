@@ -1,6 +1,7 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
 from import_export.admin import ImportExportModelAdmin
+from config.admin import JoinedRelatedAdminMixin
 from .models import CustomUser, CourseType, Course, AdminTeacher, Student
 
 # Register your models here.
@@ -10,7 +11,7 @@ class CustomUserAdmin(ImportExportModelAdmin, ModelAdmin):
     model = CustomUser
 
     list_display = ('phone', 'fullname', 'email', 'is_staff', 'is_active', 'is_superuser')
-    search_fields = ('phone', 'fullname', 'email')
+    search_fields = ('phone', 'first_name', 'last_name', 'email')
     ordering = ('phone',)
 
     fieldsets = (
@@ -44,28 +45,28 @@ class CourseTypeModelAdmin(ModelAdmin, ImportExportModelAdmin):
 
 
 @admin.register(Course)
-class CourseModelAdmin(ModelAdmin, ImportExportModelAdmin):
+class CourseModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
     list_display = ['name', 'price', 'course_type']
     list_display_links = ['name', 'price', 'course_type']
     list_filter = ['price', 'course_type']
-    search_fields = ['name', 'price', 'course_type']
+    search_fields = ['name', 'price', 'course_type__name']
     ordering = ['-price']
 
 
 @admin.register(AdminTeacher)
-class AdminTeacherModelAdmin(ModelAdmin, ImportExportModelAdmin):
+class AdminTeacherModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
     list_display =  ['user', 'role', 'course', 'is_active']
     list_display_links = ['user', 'role', 'course', 'is_active']
-    list_filter = ['role', 'course', 'is_active']
-    search_fields = ['user', 'role', 'course', 'is_active']
+    list_filter = ['branch', 'role', 'course', 'is_active']
+    search_fields = ['user__phone', 'user__first_name', 'user__last_name', 'role', 'course__name']
 
 
 @admin.register(Student)
-class StudentModelAdmin(ModelAdmin, ImportExportModelAdmin):
+class StudentModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
     list_display =  ['user', 'gender', 'year', 'level', 'xp', 'coins', 'is_active']
     list_display_links = ['user', 'gender', 'level', 'year', 'xp', 'coins', 'is_active']
-    list_filter = ['gender', 'year', 'level', 'xp', 'is_active']
-    search_fields = ['user']
+    list_filter = ['branch', 'gender', 'year', 'level', 'xp', 'is_active']
+    search_fields = ['user__phone', 'user__first_name', 'user__last_name']
     ordering = ['-level']
 
 
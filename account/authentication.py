@@ -0,0 +1,58 @@
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+
+from config.db_routers import is_pinned, read_from_primary, set_branch
+from .models import CustomUser
+from .tokens import claims_are_stale
+
+
+class ClaimsTokenUser(TokenUser):
+    """
+    Request user built from the token claims. The CustomUser row is only
+    loaded when a view asks for `instance`.
+    """
+
+    # The claim is a string, the foreign keys it is compared with are not
+    @cached_property
+    def id(self):
+        return CustomUser._meta.pk.to_python(super().id)
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def phone(self):
+        return self.token.get('phone', '')
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+    @cached_property
+    def instance(self):
+        return CustomUser.objects.get(pk=self.id)
+
+    def __str__(self):
+        return self.phone or super().__str__()
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        # The rest of the request reads and writes the token's branch
+        set_branch(validated_token.get('branch'))
+        # and, right after it wrote, only from the primary
+        if is_pinned(user.id):
+            read_from_primary()
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if claims_are_stale(validated_token):
+            raise AuthenticationFailed(_("Token claims are outdated, log in again"), code="token_outdated")
+
+        return user
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_alter_student_level'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-xp', 'id'], name='student_xp_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:44
+
+import config.db_routers
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0007_customuser_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adminteacher',
+            name='branch',
+            field=models.CharField(db_index=True, default=config.db_routers.current_branch, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='branch',
+            field=models.CharField(db_index=True, default=config.db_routers.current_branch, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='adminteacher',
+            name='course',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='account.course'),
+        ),
+        migrations.AlterField(
+            model_name='adminteacher',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='admin_teachers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='students', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_claims_versions(apps, schema_editor):
+    # Tokens issued before this migration can only be made stale with a row
+    CustomUser = apps.get_model('account', 'CustomUser')
+    ClaimsVersion = apps.get_model('account', 'ClaimsVersion')
+    alias = schema_editor.connection.alias
+    ClaimsVersion.objects.using(alias).bulk_create(
+        (ClaimsVersion(user_id=pk) for pk in CustomUser.objects.using(alias).values_list('pk', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_branch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimsVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='claims_version', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'claims_version',
+            },
+        ),
+        migrations.RunPython(create_claims_versions, migrations.RunPython.noop, hints={'model_name': 'claimsversion'}),
+    ]
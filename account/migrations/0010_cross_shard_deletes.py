@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_claimsversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adminteacher',
+            name='course',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='account.course'),
+        ),
+        migrations.AlterField(
+            model_name='adminteacher',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='admin_teachers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='students', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 
+from config.db_routers import current_branch
+
 # Create your models here.
 
 
@@ -52,6 +54,8 @@ class CustomUser(AbstractUser):
     email = models.EmailField(max_length=100, unique=True)
     profession = models.CharField(max_length=50, blank=True, null=True)
     image = models.ImageField(upload_to='users', blank=True, null=True)
+    # sha256 of `image` once its thumbnails exist, see account.thumbnails
+    image_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
 
     objects = CustomUserManager()
 
@@ -67,6 +71,20 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.fullname
 
+
+class ClaimsVersion(models.Model):
+    """
+    Bumped whenever something in a user's token claims changes, see
+    account.tokens. A row of its own, so saving a CustomUser loaded before
+    the change can't roll it back.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='claims_version')
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'claims_version'
+
+
 class CourseType(models.Model):
     name = models.CharField(max_length=20)
 
@@ -101,9 +119,13 @@ class AdminTeacher(models.Model):
         ('assistant_teacher', 'Assistant teacher'),
     )
 
-    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='admin_teachers')
+    # Users and courses are shared, admin teachers live in their branch's
+    # database. Django can't cascade across databases, account.signals
+    # deletes (or detaches) these rows in every shard instead.
+    user = models.OneToOneField(CustomUser, on_delete=models.DO_NOTHING, related_name='admin_teachers', db_constraint=False)
     role = models.CharField(max_length=20, choices=ROLE)
-    course = models.ForeignKey('Course', on_delete=models.SET_NULL, null=True, blank=True)
+    course = models.ForeignKey('Course', on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False)
+    branch = models.CharField(max_length=20, default=current_branch, db_index=True)
 
     is_active = models.BooleanField(default=True)
 
@@ -123,7 +145,9 @@ class Student(models.Model):
         ('F', 'Female'),
     )
 
-    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='students')
+    # Deleted with its user by account.signals, see AdminTeacher
+    user = models.OneToOneField(CustomUser, on_delete=models.DO_NOTHING, related_name='students', db_constraint=False)
+    branch = models.CharField(max_length=20, default=current_branch, db_index=True)
     gender = models.CharField(max_length=1, choices=GENDER)
     year = models.PositiveIntegerField(validators=[MinValueValidator(2000)])
     level = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(11)], default=1)
@@ -139,4 +163,7 @@ class Student(models.Model):
         verbose_name = 'student'
         verbose_name_plural = 'students'
         db_table = 'student'
+        indexes = [
+            models.Index(fields=['-xp', 'id'], name='student_xp_idx'),
+        ]
 
@@ -1,16 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models.functions import Lower
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from config.relations import BatchPrimaryKeyRelatedField, BatchRelatedListSerializer
 from .models import CustomUser, Course, CourseType, AdminTeacher, Student
+from .thumbnails import thumbnail_urls
+from .tokens import user_claims
+
+
+USER_UNIQUE_FIELDS = {
+    'phone': "This phone number is already registered.",
+    'email': "This email is already registered.",
+}
+
+
+def find_unique_conflicts(model, rows, unique_fields, case_insensitive=()):
+    """
+    Checks `unique_fields` ({field: error message}) of a batch of validated
+    rows with one IN query per field, including duplicates inside the batch.
+    Returns one error dict per row, empty when the row is fine.
+    """
+    def key(field, value):
+        return value.strip().lower() if field in case_insensitive else value
+
+    taken = {}
+    for field in unique_fields:
+        values = {key(field, row[field]) for row in rows if row.get(field)}
+        if not values:
+            taken[field] = set()
+        elif field in case_insensitive:
+            taken[field] = set(
+                model.objects.annotate(folded=Lower(field))
+                .filter(folded__in=values).values_list('folded', flat=True)
+            )
+        else:
+            taken[field] = set(
+                model.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True)
+            )
+
+    errors = []
+    for row in rows:
+        error = {}
+        for field, message in unique_fields.items():
+            if not row.get(field):
+                continue
+            value = key(field, row[field])
+            if value in taken[field]:
+                error[field] = [message]
+            taken[field].add(value)
+        errors.append(error)
+
+    return errors
+
+
+class UniqueBatchListSerializer(BatchRelatedListSerializer):
+    # Child serializers skip their per-object uniqueness queries under this root
+    checks_uniqueness = True
+    unique_fields = {}
+    case_insensitive = ()
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+
+        errors = find_unique_conflicts(self.child.Meta.model, items, self.unique_fields, self.case_insensitive)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
+
+class CustomUserListSerializer(UniqueBatchListSerializer):
+    unique_fields = USER_UNIQUE_FIELDS
+
+
+class CourseTypeListSerializer(UniqueBatchListSerializer):
+    unique_fields = {'name': "The course type with exactly this name already exists!"}
+    case_insensitive = ('name',)
+
+
+def uniqueness_checked_by_batch(serializer):
+    return getattr(serializer.root, 'checks_uniqueness', False)
 
 
 class StudentSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(
+    user = BatchPrimaryKeyRelatedField(
         queryset=CustomUser.objects.all(),
     )
 
     class Meta:
         model = Student
         fields = '__all__'
-        read_only_fields = ['id', 'xp', 'coins', 'level', 'is_active']
+        read_only_fields = ['id', 'xp', 'coins', 'level', 'is_active', 'branch']
+        list_serializer_class = BatchRelatedListSerializer
 
     def validate_gender(self, value:str):
         genders = ['M', 'F']
@@ -32,10 +117,10 @@ class StudentSerializer(serializers.ModelSerializer):
     
 
 class AdminTeacherSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(
+    user = BatchPrimaryKeyRelatedField(
         queryset=CustomUser.objects.all(),
     )
-    course = serializers.PrimaryKeyRelatedField(
+    course = BatchPrimaryKeyRelatedField(
         queryset = Course.objects.all(),
         required = False,
         allow_null=True
@@ -45,7 +130,8 @@ class AdminTeacherSerializer(serializers.ModelSerializer):
     class Meta:
         model = AdminTeacher
         fields = '__all__'
-        read_only_fields = ['id', 'is_active',]
+        read_only_fields = ['id', 'is_active', 'branch']
+        list_serializer_class = BatchRelatedListSerializer
 
 
     def validate_role(self, value:str):
@@ -62,16 +148,26 @@ class AdminTeacherSerializer(serializers.ModelSerializer):
 class CustomUserSerializer(serializers.ModelSerializer):
     profession = serializers.CharField(max_length=100, required=False)
     image = serializers.ImageField(required=False)
+    thumbnails = serializers.SerializerMethodField()
     password = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = CustomUser
         fields = [
             'id', 'first_name', 'last_name', 'profession',
-            'phone', 'email', 'image', 'password'
+            'phone', 'email', 'image', 'thumbnails', 'password'
         ]
         read_only_fields = ['id']
+        list_serializer_class = CustomUserListSerializer
+        # Uniqueness is checked in validate_phone/validate_email or by the batch
+        extra_kwargs = {
+            'phone': {'validators': []},
+            'email': {'validators': []},
+        }
+
 
+    def get_thumbnails(self, user):
+        return thumbnail_urls(user.image_hash, self.context.get('request'))
 
     def validate_password(self, password):
         if len(password) < 8:
@@ -105,13 +201,14 @@ class CustomUserSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Invalid phone format.")
 
 
-        qs = CustomUser.objects.exclude(id=self.instance.id if self.instance else None)
-        if qs.filter(phone=phone).exists():
-            raise serializers.ValidationError("This phone number is already registered.")
-
         if phone.startswith("998"):
             phone = "+" + phone
 
+        if not uniqueness_checked_by_batch(self):
+            qs = CustomUser.objects.exclude(id=self.instance.id if self.instance else None)
+            if qs.filter(phone=phone).exists():
+                raise serializers.ValidationError("This phone number is already registered.")
+
         return phone
 
     def validate_email(self, email):
@@ -139,9 +236,10 @@ class CustomUserSerializer(serializers.ModelSerializer):
                 "Email username can contain only letters, digits, dot, underscore or dash."
             )
 
-        qs = CustomUser.objects.exclude(id=self.instance.id if self.instance else None)
-        if qs.filter(email=email).exists():
-            raise serializers.ValidationError("This email is already registered.")
+        if not uniqueness_checked_by_batch(self):
+            qs = CustomUser.objects.exclude(id=self.instance.id if self.instance else None)
+            if qs.filter(email=email).exists():
+                raise serializers.ValidationError("This email is already registered.")
 
         return email
 
@@ -170,7 +268,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop("password")
-        user = CustomUser.objects.create(**validated_data)
+        user = CustomUser(**validated_data)
         user.set_password(password)
         user.save()
         return user
@@ -192,8 +290,55 @@ class CustomUserSerializer(serializers.ModelSerializer):
         return instance
 
 
+class AdminTeacherOnboardListSerializer(BatchRelatedListSerializer):
+    checks_uniqueness = True
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+
+        errors = find_unique_conflicts(CustomUser, [item['user'] for item in items], USER_UNIQUE_FIELDS)
+        if any(errors):
+            raise serializers.ValidationError([{'user': error} if error else {} for error in errors])
+
+        return items
+
+    def create(self, validated_data):
+        users_data = [item.pop('user') for item in validated_data]
+        passwords = [user_data.pop('password') for user_data in users_data]
+
+        with ThreadPoolExecutor() as pool:
+            hashes = list(pool.map(make_password, passwords))
+
+        users = [
+            CustomUser(**user_data, password=password_hash)
+            for user_data, password_hash in zip(users_data, hashes)
+        ]
+
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+            admin_teachers = AdminTeacher.objects.bulk_create([
+                AdminTeacher(user=user, **item)
+                for user, item in zip(users, validated_data)
+            ])
+
+        return admin_teachers
+
+
+class AdminTeacherOnboardSerializer(AdminTeacherSerializer):
+    user = CustomUserSerializer()
+
+    class Meta(AdminTeacherSerializer.Meta):
+        list_serializer_class = AdminTeacherOnboardListSerializer
+
+    def validate_user(self, user):
+        if not user.get('password'):
+            raise serializers.ValidationError({'password': ["This field is required."]})
+
+        return user
+
+
 class CourseSerializer(serializers.ModelSerializer):
-    course_type = serializers.PrimaryKeyRelatedField(
+    course_type = BatchPrimaryKeyRelatedField(
         queryset=CourseType.objects.all()
     )
 
@@ -201,6 +346,7 @@ class CourseSerializer(serializers.ModelSerializer):
         model = Course
         fields = '__all__'
         read_only_fields = ['id', 'is_active']
+        list_serializer_class = BatchRelatedListSerializer
 
     
     def validate_price(self, price):
@@ -216,14 +362,26 @@ class CourseTypeSerializer(serializers.ModelSerializer):
         model = CourseType
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = CourseTypeListSerializer
 
     def validate_name(self, name:str):
         if not name.strip():
             raise serializers.ValidationError("The name field cannot be empty!")
-        if CourseType.objects.filter(name__iexact = name.strip()).exists():
+        if not uniqueness_checked_by_batch(self) and CourseType.objects.filter(name__iexact = name.strip()).exists():
             raise serializers.ValidationError("The course type with exactly this name already exists!")
         if not name.replace(" ","").isalpha():
             raise serializers.ValidationError("The course type must contain only letters!")
 
         
-        return name
\ No newline at end of file
+        return name
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+
+        return token
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from config.db_routers import shard_databases
+from main.models import Group, VideoUpload
+from .models import AdminTeacher, Course, CustomUser, Student
+from .thumbnails import schedule_thumbnails
+from .tokens import mark_roles_changed
+
+
+# Fields that end up in token claims, see tokens.user_claims
+CLAIM_FIELDS = {
+    CustomUser: ('phone', 'is_active'),
+    AdminTeacher: ('role', 'is_active'),
+    Student: ('is_active',),
+}
+
+
+def _owner_id(instance):
+    return instance.pk if isinstance(instance, CustomUser) else instance.user_id
+
+
+@receiver(pre_save, sender=CustomUser)
+@receiver(pre_save, sender=AdminTeacher)
+@receiver(pre_save, sender=Student)
+def remember_claim_fields(sender, instance, update_fields=None, **kwargs):
+    fields = CLAIM_FIELDS[sender]
+    instance._claims_before = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(fields) & set(update_fields):
+        instance._claims_before = tuple(getattr(instance, field) for field in fields)
+        return
+
+    instance._claims_before = (
+        sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    )
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=AdminTeacher)
+@receiver(post_save, sender=Student)
+def claim_fields_saved(sender, instance, created, **kwargs):
+    after = tuple(getattr(instance, field) for field in CLAIM_FIELDS[sender])
+    if created and sender is CustomUser:
+        return
+    if created or getattr(instance, '_claims_before', None) != after:
+        mark_roles_changed(_owner_id(instance))
+
+
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=AdminTeacher)
+@receiver(post_delete, sender=Student)
+def claim_owner_deleted(sender, instance, **kwargs):
+    mark_roles_changed(_owner_id(instance))
+
+
+@receiver(post_save, sender=CustomUser)
+def image_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    # An unchanged image is recognised by its hash in the worker
+    if instance.image or instance.image_hash:
+        transaction.on_commit(lambda: schedule_thumbnails(instance.pk))
+
+
+# Users and courses live in the default database and the rows pointing at
+# them in the shards, where Django's cascade can't follow. These apply the
+# deletion in every shard instead, in this thread so the claims versions
+# bumped on the way share the default database transaction.
+
+@receiver(pre_delete, sender=CustomUser)
+def delete_user_branch_rows(sender, instance, **kwargs):
+    for alias in shard_databases():
+        with transaction.atomic(using=alias):
+            VideoUpload.objects.using(alias).filter(created_by_id=instance.pk).update(created_by=None)
+            AdminTeacher.objects.using(alias).filter(user_id=instance.pk).delete()
+            Student.objects.using(alias).filter(user_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=Course)
+def detach_course(sender, instance, **kwargs):
+    for alias in shard_databases():
+        with transaction.atomic(using=alias):
+            AdminTeacher.objects.using(alias).filter(course_id=instance.pk).update(course=None)
+            Group.objects.using(alias).filter(course_id=instance.pk).update(course=None)
@@ -1,3 +1,237 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from PIL import Image
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from config.db_routers import use_branch
+from main.views import AdminEnterPermission, AdminHomeView
+
+from .authentication import StatelessJWTAuthentication
+from .models import CustomUser, AdminTeacher, CourseType
+from .serializers import CourseTypeSerializer, CustomUserSerializer
+from .thumbnails import thumbnail_name
+
+
+PASSWORD = 'Passw0rd!'
+
+
+class StatelessAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            phone='+998901234567', email='teacher@gmail.com', password=PASSWORD
+        )
+        self.admin_teacher = AdminTeacher.objects.create(user=self.user, role='admin')
+        self.client = APIClient()
+        response = self.client.post(
+            '/auth/token/', {'phone': self.user.phone, 'password': PASSWORD}, format='json'
+        )
+        self.authorization = f"Bearer {response.data['access']}"
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+        self.url = f'/teacher_admins/{self.admin_teacher.id}/'
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_stateless_authentication_saves_user_lookup(self):
+        # The first request looks up the claims version, later ones have it cached
+        self.count_queries()
+        stateless = self.count_queries()
+        with mock.patch.object(AdminHomeView, 'authentication_classes', [JWTAuthentication]):
+            database = self.count_queries()
+
+        self.assertEqual(stateless, 1)
+        self.assertEqual(database, stateless + 1)
+
+    def test_token_user_ids_match_foreign_keys(self):
+        request = Request(
+            APIRequestFactory().get(self.url, HTTP_AUTHORIZATION=self.authorization),
+            authenticators=[StatelessJWTAuthentication()],
+        )
+        # Authentication switches to the token's branch, as BranchMiddleware would
+        with use_branch(None):
+            request.user
+
+        self.assertEqual(request.user.id, self.admin_teacher.user_id)
+        self.assertEqual(request.user.pk, self.admin_teacher.user_id)
+        self.assertTrue(AdminEnterPermission().has_object_permission(request, None, self.admin_teacher))
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivated_teacher_loses_access(self):
+        self.admin_teacher.is_active = False
+        self.admin_teacher.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_role_change_is_seen_without_this_process_cache(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.admin_teacher.role = 'assistant_teacher'
+        self.admin_teacher.save()
+        # Another worker, or this one after an eviction
+        cache.clear()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class ThumbnailTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name, THUMBNAIL_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), 'teal').save(buffer, 'JPEG')
+        self.picture = buffer.getvalue()
+
+    def create_user(self, phone):
+        user = CustomUser(phone=phone, email=f'{phone}@gmail.com')
+        user.image.save('avatar.jpg', ContentFile(self.picture), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        user.refresh_from_db()
+        return user
+
+    def test_thumbnails_are_made_once_per_content(self):
+        user = self.create_user('+998901111111')
+        self.assertTrue(user.image_hash)
+        for size in (48, 128, 512):
+            with default_storage.open(thumbnail_name(user.image_hash, size)) as file:
+                self.assertEqual(Image.open(file).size, (size, size))
+
+        thumbnails = os.path.join(default_storage.location, 'thumbnails', user.image_hash[:2])
+        self.assertEqual(len(os.listdir(thumbnails)), 3)
+        self.assertEqual(self.create_user('+998902222222').image_hash, user.image_hash)
+        self.assertEqual(len(os.listdir(thumbnails)), 3)
+
+        urls = CustomUserSerializer(user).data['thumbnails']
+        self.assertEqual(urls['48'], f'/media/{thumbnail_name(user.image_hash, 48)}')
+
+
+class BulkOnboardingTests(TestCase):
+    url = '/teacher_admins/bulk/'
+
+    def setUp(self):
+        admin = CustomUser.objects.create_user(phone='+998900000000', email='admin@gmail.com', password=PASSWORD)
+        AdminTeacher.objects.create(user=admin, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def payload(self, count, start=1):
+        return [
+            {
+                'user': {
+                    'first_name': 'Teacher', 'last_name': 'Onboarded', 'phone': f'+99891{n:07}',
+                    'email': f'teacher{n}@gmail.com', 'password': PASSWORD,
+                },
+                'role': 'main_teacher',
+            }
+            for n in range(start, start + count)
+        ]
+
+    def post(self, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, payload, format='json')
+        return response, len(queries)
+
+    def test_creates_the_whole_batch(self):
+        response, _ = self.post(self.payload(3))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['data']), 3)
+        user = CustomUser.objects.get(phone='+998910000002')
+        self.assertTrue(user.check_password(PASSWORD))
+        self.assertEqual(AdminTeacher.objects.get(user=user).role, 'main_teacher')
+
+    def test_rejected_batches_leave_no_users_behind(self):
+        payload = self.payload(3)
+        payload[2]['user']['phone'] = '998900000000'
+        response, _ = self.post(payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[2], {'user': {'phone': ["This phone number is already registered."]}})
+
+        payload = self.payload(3)
+        del payload[1]['user']['password']
+        self.assertEqual(self.post(payload)[0].status_code, 400)
+
+        # A failure after the users went in takes them out again
+        with mock.patch.object(AdminTeacher.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.post(self.payload(3))
+
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        _, small = self.post(self.payload(3))
+        _, large = self.post(self.payload(6, start=10))
+
+        # Permission, phone and email IN, savepoint, two inserts, release
+        self.assertEqual(small, 7)
+        self.assertEqual(large, small)
+
+    def test_single_user_is_saved_once(self):
+        serializer = CustomUserSerializer(data=self.payload(1)[0]['user'])
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        with self.assertNumQueries(1):
+            user = serializer.save()
+        self.assertTrue(user.check_password(PASSWORD))
+
+
+class UniqueBatchValidationTests(TestCase):
+
+    def users(self, count):
+        return [
+            {'first_name': 'Student', 'last_name': 'Imported', 'phone': f'+99893{n:07}', 'email': f'student{n}@gmail.com'}
+            for n in range(count)
+        ]
+
+    def test_a_thousand_users_are_checked_with_two_queries(self):
+        serializer = CustomUserSerializer(data=self.users(1000), many=True)
+
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_conflicts_with_stored_rows_and_inside_the_batch(self):
+        CustomUser.objects.create_user(phone='+998930000000', email='taken@gmail.com', password=PASSWORD)
+        rows = self.users(3)
+        rows[0]['phone'] = '998930000000'
+        rows[2]['email'] = rows[1]['email']
+        serializer = CustomUserSerializer(data=rows, many=True)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors, [
+            {'phone': ["This phone number is already registered."]},
+            {},
+            {'email': ["This email is already registered."]},
+        ])
+
+    def test_course_type_names_ignore_case_and_spaces(self):
+        CourseType.objects.create(name='Python')
+        serializer = CourseTypeSerializer(data=[{'name': ' python '}, {'name': 'Web Design'}, {'name': 'web design '}], many=True)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        message = "The course type with exactly this name already exists!"
+        self.assertEqual(serializer.errors, [{'name': [message]}, {}, {'name': [message]}])
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+
+from .models import CustomUser
+
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_name(image_hash, size):
+    # Named by content, so the same picture is only ever resized once
+    return f'thumbnails/{image_hash[:2]}/{image_hash}_{size}.webp'
+
+
+def thumbnail_urls(image_hash, request=None):
+    if not image_hash:
+        return None
+
+    urls = {}
+    for size in settings.THUMBNAIL_SIZES:
+        url = default_storage.url(thumbnail_name(image_hash, size))
+        urls[str(size)] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def _render(image, size):
+    thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    thumbnail.save(buffer, 'WEBP', quality=80, method=4)
+    return ContentFile(buffer.getvalue())
+
+
+def make_thumbnails(user_id):
+    """
+    Makes the THUMBNAIL_SIZES thumbnails of a user's image unless files for
+    the same content already exist, then records the image hash.
+    """
+    user = CustomUser.objects.filter(pk=user_id).only('image', 'image_hash').first()
+    if user is None:
+        return
+    if not user.image:
+        if user.image_hash:
+            CustomUser.objects.filter(pk=user_id, image='').update(image_hash='')
+        return
+
+    digest = hashlib.sha256()
+    with user.image.open('rb') as file:
+        while data := file.read(READ_SIZE):
+            digest.update(data)
+    image_hash = digest.hexdigest()
+    if image_hash == user.image_hash:
+        return
+
+    missing = [
+        size for size in settings.THUMBNAIL_SIZES
+        if not default_storage.exists(thumbnail_name(image_hash, size))
+    ]
+    if missing:
+        with user.image.open('rb') as file:
+            image = Image.open(file)
+            # JPEGs can be decoded at a fraction of their size straight away
+            image.draft('RGB', (max(missing), max(missing)))
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+        for size in missing:
+            default_storage.save(thumbnail_name(image_hash, size), _render(image, size))
+
+    # Skipped when the image was replaced meanwhile, its own job records it
+    CustomUser.objects.filter(pk=user_id, image=user.image.name).update(image_hash=image_hash)
+
+
+def _run(user_id):
+    try:
+        make_thumbnails(user_id)
+    except Exception:
+        logger.exception("Could not make thumbnails for user %s", user_id)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnails(user_id):
+    if not settings.THUMBNAIL_WORKERS:
+        make_thumbnails(user_id)
+        return
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    _executor.submit(_run, user_id)
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework_simplejwt.settings import api_settings
+
+from config.db_routers import SHARED_KEY_PREFIX, shard_databases
+from .models import AdminTeacher, ClaimsVersion, CustomUser, Student
+
+
+ADMIN_ROLES = ('admin', 'main_teacher', 'assistant_teacher')
+STUDENT_ROLE = 'student'
+
+CLAIMS_VERSION = 'claims_version'
+CLAIMS_VERSION_KEY = SHARED_KEY_PREFIX + 'account:claims_version:{}'
+# Cached version of a user who no longer exists
+DELETED = -1
+
+
+def user_claims(user):
+    # Users are shared, their admin teacher or student row is in one of the shards
+    for alias in shard_databases():
+        admin_teacher = (
+            AdminTeacher.objects.using(alias)
+            .filter(user_id=user.id, is_active=True)
+            .values('id', 'role', 'branch')
+            .first()
+        )
+        student = (
+            Student.objects.using(alias)
+            .filter(user_id=user.id, is_active=True)
+            .values('id', 'branch')
+            .first()
+        )
+        if admin_teacher or student:
+            break
+
+    if admin_teacher:
+        role = admin_teacher['role']
+    elif student:
+        role = STUDENT_ROLE
+    else:
+        role = None
+
+    return {
+        'phone': user.phone,
+        'is_active': user.is_active,
+        'role': role,
+        'admin_teacher_id': admin_teacher['id'] if admin_teacher else None,
+        'student_id': student['id'] if student else None,
+        'branch': (admin_teacher or student or {}).get('branch'),
+        CLAIMS_VERSION: ClaimsVersion.objects.get_or_create(user_id=user.id)[0].version,
+    }
+
+
+def mark_roles_changed(user_id):
+    """
+    Makes every token issued to the user so far stale, in all processes.
+    Users get their ClaimsVersion row when a token is first issued to them,
+    until then there is nothing to make stale.
+    """
+    ClaimsVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    cache.delete(CLAIMS_VERSION_KEY.format(user_id))
+
+
+def claims_version(user_id):
+    """
+    The user's current claims version, DELETED once the user is gone. The
+    database has the truth, the cache only saves the lookup for
+    CLAIMS_VERSION_CACHE_TIMEOUT seconds, which bounds how long a process
+    with a cache of its own keeps accepting a stale token.
+    """
+    key = CLAIMS_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        row = CustomUser.objects.filter(pk=user_id).values_list('claims_version__version').first()
+        version = DELETED if row is None else row[0] or 0
+        cache.set(key, version, timeout=settings.CLAIMS_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def claims_are_stale(token):
+    version = claims_version(token[api_settings.USER_ID_CLAIM])
+    return version == DELETED or token.get(CLAIMS_VERSION, 0) < version
@@ -0,0 +1,251 @@
+"""
+Branch sharding. The rows of the `account` and `main` apps belong to a
+branch and live in the database BRANCH_DATABASES maps it to. SHARED_MODELS
+and the other apps stay in the default database, which every shard attaches
+read-only (see config/sqlite.py), so joins from branch rows to users, courses
+or weekdays keep working. Without BRANCH_DATABASES everything stays in the
+default database and the router has no say; rows written back then are
+copied to their shards by `manage.py copy_to_shards`.
+
+The branch of a request comes from its token (account.authentication) and
+is reset for every request by config.middleware.BranchMiddleware.
+
+DATABASE_REPLICAS lists read replicas of any of these databases. Safe
+requests read from one unless their user wrote in the last
+REPLICA_PIN_SECONDS (config.middleware.ReplicaMiddleware), everything else
+uses the primary.
+"""
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+BRANCH_APPS = ('account', 'main')
+SHARED_MODELS = {
+    'account.customuser', 'account.customuser_groups', 'account.customuser_user_permissions',
+    'account.claimsversion', 'account.course', 'account.coursetype',
+    'main.weekday', 'main.blob',
+}
+
+PIN_KEY = 'db:primary_pin:{}'
+# Cache keys about shared rows, the same in every shard
+SHARED_KEY_PREFIX = 'shared:'
+
+_branch = ContextVar('branch', default=None)
+_read_replica = ContextVar('read_replica', default=False)
+
+
+def current_branch():
+    return _branch.get() or settings.DEFAULT_BRANCH
+
+
+def set_branch(branch):
+    _branch.set(branch)
+
+
+@contextmanager
+def use_branch(branch):
+    token = _branch.set(branch)
+    try:
+        yield
+    finally:
+        _branch.reset(token)
+
+
+def branch_database(branch):
+    if not settings.BRANCH_DATABASES:
+        return DEFAULT_DB_ALIAS
+    try:
+        return settings.BRANCH_DATABASES[branch]
+    except KeyError:
+        raise ImproperlyConfigured(f"No database for branch {branch!r} in BRANCH_DATABASES.")
+
+
+def current_database():
+    return branch_database(current_branch())
+
+
+def shard_databases():
+    return list(dict.fromkeys(settings.BRANCH_DATABASES.values())) or [DEFAULT_DB_ALIAS]
+
+
+def primary_database(alias):
+    for primary, replicas in settings.DATABASE_REPLICAS.items():
+        if alias in replicas:
+            return primary
+    return alias
+
+
+def read_database(alias):
+    """`alias` or, when the current request may read stale rows, one of its replicas."""
+    replicas = settings.DATABASE_REPLICAS.get(alias)
+    # Reads inside a transaction belong to it
+    if not replicas or not _read_replica.get() or connections[alias].in_atomic_block:
+        return alias
+    return random.choice(replicas)
+
+
+@contextmanager
+def use_replica(allowed):
+    token = _read_replica.set(allowed)
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
+
+
+def read_from_primary():
+    _read_replica.set(False)
+
+
+def pin_to_primary(user_id):
+    cache.set(PIN_KEY.format(user_id), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return bool(settings.DATABASE_REPLICAS) and cache.get(PIN_KEY.format(user_id), False)
+
+
+def is_branch_model(model):
+    opts = model._meta
+    return opts.app_label in BRANCH_APPS and opts.label_lower not in SHARED_MODELS
+
+
+def fan_out(function):
+    """
+    Calls function(alias) for every shard, in parallel when there are
+    several, and returns the results in shard order.
+    """
+    aliases = shard_databases()
+    if len(aliases) == 1:
+        return [function(aliases[0])]
+
+    def run(alias):
+        try:
+            return function(alias)
+        finally:
+            connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=len(aliases), thread_name_prefix='shards') as pool:
+        return list(pool.map(run, aliases))
+
+
+def make_cache_key(key, key_prefix, version):
+    # Ids repeat across shards, so each shard caches under its own prefix
+    if settings.BRANCH_DATABASES and not key.startswith(SHARED_KEY_PREFIX):
+        key_prefix = f'{key_prefix}:{current_database()}'
+    return f'{key_prefix}:{version}:{key}'
+
+
+class ShardLocal:
+    """
+    Process-local state kept per shard: one factory() object for each, and
+    attribute access goes to the one of the current branch.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        alias = current_database()
+        if alias not in self._objects:
+            with self._lock:
+                if alias not in self._objects:
+                    self._objects[alias] = self._factory()
+        return getattr(self._objects[alias], name)
+
+
+class BranchRouter:
+
+    def shard(self, hints):
+        instance = hints.get('instance')
+        if instance is not None and is_branch_model(instance):
+            # Rows stay where they were loaded, related rows follow them
+            if instance._state.db:
+                return instance._state.db
+            if getattr(instance, 'branch', None):
+                return branch_database(instance.branch)
+        return current_database()
+
+    def db_for_read(self, model, **hints):
+        if not settings.BRANCH_DATABASES:
+            return None
+        if is_branch_model(model):
+            return self.shard(hints)
+
+        instance = hints.get('instance')
+        if instance is not None and is_branch_model(instance) and instance._state.db:
+            # Read through the shard's attached copy, so the query can join
+            # the branch tables (m2m through tables, select_related)
+            return instance._state.db
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if not settings.BRANCH_DATABASES:
+            return None
+        if is_branch_model(model):
+            return self.shard(hints)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.BRANCH_DATABASES:
+            return None
+        if is_branch_model(obj1) and is_branch_model(obj2):
+            return primary_database(obj1._state.db) == primary_database(obj2._state.db)
+        # Shared rows can be referenced from any shard
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not settings.BRANCH_DATABASES or model_name is None:
+            return None
+        if app_label in BRANCH_APPS and f'{app_label}.{model_name}' not in SHARED_MODELS:
+            return db in settings.BRANCH_DATABASES.values()
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter(BranchRouter):
+    """
+    BranchRouter with DATABASE_REPLICAS: reads go to a replica of the
+    database it picks when the request allows it, writes always go to the
+    primary, also for rows that were read from a replica.
+    """
+
+    def primary(self, hints):
+        # What Django falls back to without a router, minus the replicas
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return primary_database(instance._state.db)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        if not settings.DATABASE_REPLICAS:
+            return alias
+        return read_database(primary_database(alias or self.primary(hints)))
+
+    def db_for_write(self, model, **hints):
+        alias = super().db_for_write(model, **hints)
+        if not settings.DATABASE_REPLICAS:
+            return alias
+        return primary_database(alias or self.primary(hints))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        allowed = super().allow_relation(obj1, obj2, **hints)
+        if allowed is None and settings.DATABASE_REPLICAS:
+            return primary_database(obj1._state.db) == primary_database(obj2._state.db)
+        return allowed
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if primary_database(db) != db:
+            return False
+        return super().allow_migrate(db, app_label, model_name, **hints)
@@ -0,0 +1,197 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+
+from .db_routers import is_pinned, pin_to_primary, use_branch, use_replica
+
+
+logger = logging.getLogger('config.queries')
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'primary_pin'
+
+
+class QueryStats:
+    """execute_wrapper that counts and times every statement of a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # Same statement with a different number of IN (...) values is one pattern
+            self.statements[IN_LIST.sub('IN (...)', sql)] += 1
+
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count > threshold]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the number of queries, the time spent in the database and the
+    statements repeated more than QUERY_DUPLICATE_THRESHOLD times for each
+    request. They are sent back in a Server-Timing header and logged to
+    'config.queries', repeated statements as likely N+1 warnings.
+    Enabled with QUERY_INSTRUMENTATION.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.QUERY_DUPLICATE_THRESHOLD
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def wrap_connections(self, stack, stats):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.wrap_connections(stack, stats)
+            response = self.get_response(request)
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # The async ORM runs queries in the request's sync thread, so the
+        # connections of that thread are the ones to wrap
+        stats = QueryStats()
+        start = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    def finish(self, request, response, stats, total):
+        timing = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", total;dur={total * 1000:.1f}'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        match = request.resolver_match
+        view = match.view_name if match else None
+        duplicates = stats.duplicates(self.threshold)
+        logger.info(
+            '%s %s %s queries=%d db_ms=%.1f total_ms=%.1f duplicates=%d',
+            request.method, request.path, response.status_code,
+            stats.count, stats.duration * 1000, total * 1000, len(duplicates),
+            extra={
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': stats.count,
+                'db_ms': round(stats.duration * 1000, 1),
+                'total_ms': round(total * 1000, 1),
+            },
+        )
+        for sql, count in duplicates:
+            logger.warning(
+                'Possible N+1 in %s: statement ran %d times: %s', view or request.path, count, sql,
+                extra={'view': view, 'path': request.path, 'count': count, 'sql': sql},
+            )
+
+        return response
+
+
+class BranchMiddleware:
+    """Starts every request on the default branch, so no branch leaks from the previous one."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_branch(None):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with use_branch(None):
+            return await self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """
+    Lets safe requests read from DATABASE_REPLICAS, and pins users to the
+    primary for REPLICA_PIN_SECONDS after a successful unsafe request, so they
+    read their own writes: by cookie, and in the cache by user id for token
+    users, whom account.authentication checks once it knows them. The pin has
+    to reach every process, so a per-process cache is refused.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        if isinstance(caches['default'], LocMemCache):
+            raise ImproperlyConfigured("DATABASE_REPLICAS needs a cache shared between processes, set CACHE_URL.")
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def allows_replica(self, request):
+        if request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            return False
+        user = getattr(request, 'user', None)
+        return not (user and user.is_authenticated and is_pinned(user.id))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_replica(self.allows_replica(request)):
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        # Session users are loaded lazily, from the database
+        allowed = await sync_to_async(self.allows_replica)(request)
+        with use_replica(allowed):
+            response = await self.get_response(request)
+        return await sync_to_async(self.finish)(request, response)
+
+    def finish(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        # DRF sets the user it authenticated on the Django request too
+        user = getattr(request, 'user', None)
+        if user and user.is_authenticated:
+            pin_to_primary(user.id)
+        response.set_cookie(
+            PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+        )
+        return response
@@ -0,0 +1,81 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.utils import html
+
+
+class BatchPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that, under a BatchRelatedListSerializer, takes its
+    objects from one in_bulk() call made for the whole batch instead of a
+    get() per item. Outside of a batch it behaves exactly like its parent.
+    """
+
+    def _batch(self):
+        parent = self.parent
+        while parent is not None:
+            if isinstance(parent, BatchRelatedListSerializer):
+                return parent
+            parent = parent.parent
+        return None
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def to_internal_value(self, data):
+        batch = self._batch()
+        prefetched = getattr(batch, 'prefetched_relations', {}).get(self)
+        if prefetched is None:
+            return super().to_internal_value(data)
+
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        if pk not in prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
+
+class BatchRelatedListSerializer(serializers.ListSerializer):
+    """
+    Resolves every BatchPrimaryKeyRelatedField of the child serializer (and
+    of its nested serializers), many=True ones included, with one in_bulk()
+    query per field.
+    """
+
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = html.parse_html_list(data, default=[])
+
+        self.prefetched_relations = {}
+        if isinstance(data, list):
+            pks = {}
+            self._collect_pks(self.child, data, pks)
+            for field, values in pks.items():
+                self.prefetched_relations[field] = field.get_queryset().in_bulk(values)
+
+        return super().to_internal_value(data)
+
+    def _collect_pks(self, serializer, rows, pks):
+        for name, field in serializer.fields.items():
+            if field.read_only:
+                continue
+
+            values = [row[name] for row in rows if isinstance(row, dict) and row.get(name) is not None]
+            if isinstance(field, serializers.ManyRelatedField):
+                field = field.child_relation
+                values = [value for many in values if isinstance(many, (list, tuple)) for value in many]
+            if isinstance(field, BatchPrimaryKeyRelatedField):
+                bucket = pks.setdefault(field, set())
+                for value in values:
+                    try:
+                        bucket.add(field.to_pk(value))
+                    except (TypeError, ValueError, DjangoValidationError):
+                        pass
+            elif isinstance(field, serializers.Serializer):
+                self._collect_pks(field, values, pks)
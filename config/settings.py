@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from datetime import timedelta
+from datetime import time, timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,11 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.QueryInstrumentationMiddleware',
+    'config.middleware.BranchMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,10 +88,84 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite settings added to the database by SQLITE_PROFILE. 'production' uses
+# WAL, so readers and the writer don't block each other, has Django run its
+# PRAGMAs on every new connection (init_command) and starts transactions
+# with BEGIN IMMEDIATE, so concurrent writers wait for busy_timeout instead
+# of failing with "database is locked" when a read turns into a write.
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode = WAL;'
+                'PRAGMA synchronous = NORMAL;'
+                'PRAGMA busy_timeout = 5000;'
+                f'PRAGMA mmap_size = {256 * 1024 * 1024};'
+                f'PRAGMA cache_size = {-64 * 1024};'
+                'PRAGMA temp_store = MEMORY;'
+            ),
+        },
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[SQLITE_PROFILE],
+    }
+}
+
+# Branch sharding, see config/db_routers.py. BRANCHES="code,code,..." gives
+# each branch its own database, db_<code>.sqlite3, for its `account` and
+# `main` rows. Users, courses, weekdays and blobs stay in the default one,
+# which the shards attach as 'shared'. Without BRANCHES every branch lives
+# in the default database. To shard an existing database, before serving
+# with BRANCHES set: `manage.py migrate --database branch_<code>` for every
+# branch, then `manage.py copy_to_shards`, both with BRANCHES set.
+BRANCHES = [branch for branch in os.environ.get('BRANCHES', '').split(',') if branch]
+# Branch of requests without one in their token (the admin site, anonymous)
+DEFAULT_BRANCH = os.environ.get('DEFAULT_BRANCH', BRANCHES[0] if BRANCHES else 'main')
+BRANCH_DATABASES = {}
+for branch in BRANCHES:
+    BRANCH_DATABASES[branch] = f'branch_{branch}'
+    DATABASES[f'branch_{branch}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db_{branch}.sqlite3',
+        'ATTACH': {'shared': 'default'},
+    }
+
+# Read replicas, see config/db_routers.py: {primary alias: [replica aliases]}.
+# REPLICAS=1 gives every database a <name>_replica.sqlite3 next to it, kept up
+# to date by `manage.py replicate` (or Litestream and the like). Safe requests
+# read from it unless their user wrote in the last REPLICA_PIN_SECONDS, which
+# is kept in the cache, so replicas need CACHE_URL.
+DATABASE_REPLICAS = {}
+if os.environ.get('REPLICAS') == '1':
+    for alias, database in list(DATABASES.items()):
+        DATABASE_REPLICAS[alias] = [f'{alias}_replica']
+        DATABASES[f'{alias}_replica'] = {
+            **database,
+            'NAME': Path(database['NAME']).with_name(f"{Path(database['NAME']).stem}_replica.sqlite3"),
+            'TEST': {'MIRROR': alias},
+        }
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+DATABASE_ROUTERS = ['config.db_routers.ReplicaRouter']
+
+# Cache keys carry the shard, ids repeat across them. CACHE_URL
+# ("redis://host:6379/0") shares the cache between processes, without it
+# every process has its own and never sees another one's invalidations.
+CACHE_URL = os.environ.get('CACHE_URL')
+SHARED_CACHE = bool(CACHE_URL)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache' if SHARED_CACHE else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': CACHE_URL or '',
+        'KEY_FUNCTION': 'config.db_routers.make_cache_key',
     }
 }
 
@@ -140,14 +217,76 @@ AUTH_USER_MODEL = 'account.CustomUser'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES":(
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+        "account.authentication.StatelessJWTAuthentication",
+    ),
+    "DEFAULT_PAGINATION_CLASS": "config.pagination.IdCursorPagination",
+    "PAGE_SIZE": 50,
 }
 
 SIMPLE_JWT = {
-    "ACCESS_TOKEN_LIFETIME": timedelta(days=5),
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "AUTH_HEADER_TYPES": ("Bearer", "Token")
+    "AUTH_HEADER_TYPES": ("Bearer", "Token"),
+    "TOKEN_OBTAIN_SERIALIZER": "account.serializers.RoleTokenObtainPairSerializer",
+    "TOKEN_USER_CLASS": "account.authentication.ClaimsTokenUser",
+}
+
+# Seconds a process trusts its cached copy of a user's claims version (see
+# account.tokens) before checking the database again
+CLAIMS_VERSION_CACHE_TIMEOUT = 30
+
+# Seconds a process keeps its leaderboards before reloading them
+LEADERBOARD_TTL = 60
+
+# Opening hours used by the free slot finder
+SCHEDULE_DAY_START = time(8, 0)
+SCHEDULE_DAY_END = time(22, 0)
+
+# Timetables are invalidated by signals. With a shared cache the timeout only
+# bounds memory use, otherwise it bounds how stale other processes can be.
+TIMETABLE_CACHE_TIMEOUT = 60 * 60 * 24 * 7 if SHARED_CACHE else 60
+
+# Uploads are hashed while they are received, see main.storage
+FILE_UPLOAD_HANDLERS = [
+    'main.storage.HashingMemoryFileUploadHandler',
+    'main.storage.HashingTemporaryFileUploadHandler',
+]
+
+# Resumable lesson video uploads. Part files live next to MEDIA_ROOT so a
+# finished upload is moved into place, not copied.
+VIDEO_UPLOAD_TEMP_DIR = BASE_DIR / 'uploads'
+VIDEO_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+VIDEO_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+VIDEO_UPLOAD_MAX_SIZE = 20 * 1024 ** 3
+# Hours without a chunk after which `manage.py expire_uploads` fails an upload
+VIDEO_UPLOAD_EXPIRY_HOURS = 24
+
+# Who sends the bytes of protected files: 'django' streams them from the
+# worker, 'x-accel-redirect' (nginx) and 'x-sendfile' (Apache, lighttpd)
+# hand them to the web server
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+# Internal nginx location aliased to MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Square WebP thumbnails made from CustomUser.image, and the threads making
+# them after the request. 0 workers makes them inline.
+THUMBNAIL_SIZES = (48, 128, 512)
+THUMBNAIL_WORKERS = 2
+
+# Query count and DB time per request (Server-Timing header and logs)
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION') == '1'
+# A statement repeated more times than this in one request is logged as a likely N+1
+QUERY_DUPLICATE_THRESHOLD = 10
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "config.queries": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
 }
 
 SWAGGER_SETTINGS = {
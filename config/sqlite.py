@@ -0,0 +1,28 @@
+from urllib.parse import quote
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def read_only_uri(name):
+    name = str(name)
+    if not name.startswith('file:'):
+        return f'file:{quote(name)}?mode=ro'
+    # In-memory test databases can't be opened read-only
+    return name if 'mode=' in name else f"{name}{'&' if '?' in name else '?'}mode=ro"
+
+
+@receiver(connection_created, dispatch_uid='config.sqlite.attach_databases')
+def attach_databases(sender, connection, **kwargs):
+    """
+    Attaches the ATTACH databases ({schema: alias}) of a SQLite database to
+    each new connection, read-only. Their names are only known at run time
+    (tests rename them), so this can't be an init_command.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    # Straight to sqlite3, so they don't show up as queries of the request
+    for schema, alias in connection.settings_dict.get('ATTACH', {}).items():
+        name = connections[alias].settings_dict['NAME']
+        connection.connection.execute(f'ATTACH DATABASE ? AS "{schema}"', [read_only_uri(name)])
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import date, datetime, time, timezone
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from account.admin import CustomUserAdmin
+from account.models import AdminTeacher, Course, CustomUser, Student
+from main.models import Group, Homework, Lesson, Room, Weekday
+from main.serializers import GroupSerializer
+
+from .pagination import Keyset, TimeCursorPagination
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        group = Group.objects.create(
+            name='Group 1', start_date=date(2026, 1, 1), end_date=date(2026, 6, 1), start_time=time(9), end_time=time(10)
+        )
+        lesson = Lesson.objects.create(name='Lesson 1', group=group, task_text='-', task_file='task.pdf')
+        user = CustomUser.objects.create_user(phone='+998901111111', email='student@gmail.com', password='x')
+        student = Student.objects.create(user=user, gender='M', year=2010)
+        homeworks = Homework.objects.bulk_create(
+            Homework(lesson=lesson, student=student, group=group, text=str(n), status='waiting') for n in range(7)
+        )
+        # Five rows share one timestamp, two share another
+        for homework, hour in zip(homeworks, (9, 9, 9, 9, 9, 10, 10)):
+            Homework.objects.filter(pk=homework.pk).update(time=datetime(2026, 3, 1, hour, tzinfo=timezone.utc))
+        self.expected = list(Homework.objects.order_by('-time', '-id').values_list('id', flat=True))
+
+    def page(self, url):
+        paginator = TimeCursorPagination()
+        with CaptureQueriesContext(connection) as queries:
+            rows = paginator.paginate_queryset(Homework.objects.all(), Request(APIRequestFactory().get(url)))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+        return [row.id for row in rows], paginator.get_next_link(), paginator.get_previous_link()
+
+    def test_pages_through_tied_timestamps_in_both_directions(self):
+        seen, urls, url = [], [], '/homeworks/?page_size=2'
+        while url:
+            urls.append(url)
+            ids, url, _ = self.page(url)
+            seen += ids
+        self.assertEqual(seen, self.expected)
+
+        ids, _, previous = self.page(urls[-1])
+        back = []
+        while previous:
+            earlier, _, previous = self.page(previous)
+            back = earlier + back
+        self.assertEqual(back + ids, self.expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('nonsense', Keyset(['-time']).encode({'after': ['yesterday', 1]})):
+            with self.assertRaises(NotFound):
+                TimeCursorPagination().paginate_queryset(
+                    Homework.objects.all(), Request(APIRequestFactory().get('/homeworks/', {'cursor': cursor}))
+                )
+
+
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_DUPLICATE_THRESHOLD=1)
+class QueryInstrumentationTests(TestCase):
+
+    def setUp(self):
+        user = CustomUser.objects.create_superuser(phone='+998901234567', email='admin@gmail.com', password='x')
+        self.client.force_login(user)
+
+    def test_server_timing_and_repeated_statements(self):
+        with self.assertLogs('config.queries', 'INFO') as logs:
+            response = self.client.get('/admin/account/customuser/')
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('queries=', logs.output[0])
+
+        def group_count(user):
+            return user.groups.count()
+
+        CustomUser.objects.bulk_create(
+            CustomUser(phone=f'+99891000000{n}', email=f'user{n}@gmail.com') for n in range(3)
+        )
+        with mock.patch.object(CustomUserAdmin, 'list_display', ('phone', group_count)):
+            with self.assertLogs('config.queries', 'WARNING') as logs:
+                self.client.get('/admin/account/customuser/')
+
+        self.assertIn('Possible N+1', logs.output[0])
+
+
+class SQLiteProfileTests(TestCase):
+
+    def test_production_profile_runs_its_pragmas_on_new_connections(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'db.sqlite3')
+        database = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': path,
+            **settings.SQLITE_PROFILES['production'],
+        }, alias='sqlite_profile')
+        database.ensure_connection()
+        self.addCleanup(database.close)
+
+        def pragma(name):
+            return database.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+        self.assertEqual(pragma('journal_mode'), 'wal')
+        self.assertEqual(pragma('synchronous'), 1)
+        self.assertEqual(pragma('busy_timeout'), 5000)
+        self.assertEqual(database.transaction_mode, 'IMMEDIATE')
+        # WAL is a property of the file, other connections see it too
+        with closing(sqlite3.connect(path)) as other:
+            self.assertEqual(other.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+
+class BatchRelatedFieldTests(TestCase):
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(phone='+998901111111', email='teacher@gmail.com', password='x')
+        self.teacher = AdminTeacher.objects.create(user=user, role='main_teacher')
+        self.room = Room.objects.create(name='1')
+        self.course = Course.objects.create(name='Python', price=100)
+        self.days = [Weekday.objects.create(name=name, number=n) for n, name in enumerate(('Monday', 'Wednesday', 'Friday'))]
+
+    def group(self, n, days=None):
+        return {
+            'name': f'Group {n}', 'start_date': '2026-01-01', 'end_date': '2026-06-01',
+            'start_time': '09:00', 'end_time': '10:00', 'room': self.room.id, 'teacher': self.teacher.id,
+            'course': self.course.id, 'days': [day.id for day in self.days] if days is None else days,
+        }
+
+    def test_many_related_fields_are_resolved_once_per_batch(self):
+        serializer = GroupSerializer(data=[self.group(n) for n in range(20)], many=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        weekday_queries = [query for query in queries if '"weekday"' in query['sql']]
+        self.assertEqual(len(weekday_queries), 1)
+        # Four in_bulk() lookups and the name's UniqueValidator per group, the
+        # schedule index syncs on its own terms
+        relation_queries = [query for query in queries if '"schedule_change"' not in query['sql']]
+        self.assertEqual(len(relation_queries), 4 + 20)
+        self.assertEqual(serializer.validated_data[19]['days'], self.days)
+
+    def test_batch_errors_match_the_single_serializer(self):
+        for days in ([self.days[0].id, 999], ['x'], [True], []):
+            single = GroupSerializer(data=self.group(0, days))
+            batch = GroupSerializer(data=[self.group(1), self.group(2, days)], many=True)
+
+            self.assertFalse(single.is_valid())
+            self.assertFalse(batch.is_valid())
+            self.assertEqual(batch.errors, [{}, {'days': single.errors['days']}])
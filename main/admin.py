@@ -1,6 +1,8 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
 from import_export.admin import ImportExportModelAdmin
+from config.admin import JoinedRelatedAdminMixin
+from .services import generate_lessons, publish_lesson
 from .models import (
     Weekday,
     Room,
@@ -16,55 +18,68 @@ from .models import (
 
 @admin.register(Weekday)
 class WeekdayModelAdmin(ModelAdmin):
-    list_display =  ['name']
+    list_display =  ['name', 'number']
     search_fields = ['name']
 
 
 @admin.register(Room)
 class RoomModelAdmin(ModelAdmin):
-    list_display =  ['name']
+    list_display =  ['name', 'branch']
+    list_filter = ['branch']
     search_fields = ['name']
 
 
 @admin.register(Group)
-class GroupModelAdmin(ModelAdmin, ImportExportModelAdmin):
+class GroupModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
     list_display =  ['name', 'course', 'teacher', 'room']
     list_display_links = ['name', 'course', 'teacher', 'room']
-    list_filter = ['course', 'teacher', 'days']
-    search_fields = ['name', 'course', 'teacher', 'room']
+    list_filter = ['branch', 'course', 'teacher', 'days']
+    search_fields = ['name', 'course__name', 'teacher__user__first_name', 'teacher__user__last_name', 'room__name']
     ordering = ['-end_date']
+    actions = ['generate_lessons']
+
+    @admin.action(description="Generate lessons for the whole term")
+    def generate_lessons(self, request, queryset):
+        created, removed = generate_lessons(queryset)
+        self.message_user(request, f"{created} lessons created, {removed} lessons removed.")
 
 
 @admin.register(StudentGroup)
-class StudentGroupModelAdmin(ModelAdmin, ImportExportModelAdmin):
+class StudentGroupModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
     list_display =  ['student', 'group', 'status']
     list_display_links = ['student', 'group', 'status']
     list_filter = ['student', 'group', 'status']
-    search_fields = ['student', 'group', 'status']
+    search_fields = ['student__user__phone', 'student__user__first_name', 'student__user__last_name', 'group__name', 'status']
     ordering = ['-left_at']
 
 
 @admin.register(Lesson)
-class LessonModelAdmin(ModelAdmin, ImportExportModelAdmin):
-    list_display =  ['name', 'group', 'day']
+class LessonModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
+    list_display =  ['name', 'group', 'day', 'is_published']
     list_display_links = ['name', 'group', 'day']
-    list_filter = ['group', 'day']
-    search_fields = ['name', 'group', 'day', 'task_file', 'task_text']
+    list_filter = ['group', 'day', 'is_published']
+    search_fields = ['name', 'group__name', 'day__name', 'task_file', 'task_text']
+    actions = ['publish']
+
+    @admin.action(description="Publish and give homework to active students")
+    def publish(self, request, queryset):
+        created = sum(publish_lesson(lesson) for lesson in queryset)
+        self.message_user(request, f"{created} homeworks created.")
 
 
 @admin.register(Homework)
-class HomeworkModelAdmin(ModelAdmin, ImportExportModelAdmin):
+class HomeworkModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
     list_display = ['student', 'group', 'lesson', 'status']
     list_display_links = ['student', 'group', 'lesson', 'status']
     list_filter = ['student', 'lesson', 'group', 'status']
-    search_fields = ['student', 'group', 'lesson', 'status', 'text']
+    search_fields = ['student__user__phone', 'student__user__first_name', 'student__user__last_name', 'group__name', 'lesson__name', 'status', 'text']
     ordering = ['-time']
 
 
 @admin.register(Attendence)
-class AttendenceModelAdmin(ModelAdmin, ImportExportModelAdmin):
+class AttendenceModelAdmin(JoinedRelatedAdminMixin, ModelAdmin, ImportExportModelAdmin):
     list_display =  ['student', 'lesson', 'status']
     list_display_links = ['student', 'lesson', 'status']
     list_filter = ['student', 'lesson', 'status']
-    search_fields = ['student', 'lesson', 'status']
+    search_fields = ['student__user__phone', 'student__user__first_name', 'student__user__last_name', 'lesson__name', 'status']
     ordering = ['-time']
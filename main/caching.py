@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+
+VERSION_KEY = 'main:version:{}'
+
+
+def get_version(name):
+    return cache.get_or_set(VERSION_KEY.format(name), 1, timeout=None)
+
+
+def bump_version(name):
+    """
+    Invalidates everything built under `name` in every process that shares
+    the cache backend. Returns the new version.
+    """
+    key = VERSION_KEY.format(name)
+    cache.add(key, 1, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 2, timeout=None)
+        return 2
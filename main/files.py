@@ -0,0 +1,110 @@
+import mimetypes
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+
+BLOCK_SIZE = 64 * 1024
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single byte range, both inclusive, or None when the
+    whole file should be sent. Raises ValueError when it can't be satisfied.
+    Multiple ranges are answered with the whole file, which HTTP allows.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # Suffix range: the last `end` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+
+    if start > end or start >= size:
+        raise ValueError
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    # A range conditioned on another version of the file gets the whole file
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def stream(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def serve_file(request, fieldfile):
+    """
+    Serves a stored file with byte ranges and ETag/Last-Modified validation.
+    With MEDIA_SERVE_MODE set to 'x-accel-redirect' or 'x-sendfile' only the
+    headers are built here and the web server sends the bytes, ranges
+    included.
+    """
+    storage, name = fieldfile.storage, fieldfile.name
+    try:
+        size = storage.size(name)
+        last_modified = int(storage.get_modified_time(name).timestamp())
+    except FileNotFoundError:
+        raise Http404
+    etag = f'"{size:x}-{last_modified:x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{name}"
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = storage.path(name)
+    else:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range is None or not range_applies(request, etag, last_modified):
+            response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                stream(storage.open(name, 'rb'), start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,117 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from account.models import Student
+from config.db_routers import ShardLocal
+from .caching import get_version
+
+
+SCOPES = ('global', 'course', 'group')
+
+
+class Board:
+    """
+    Students of one scope kept sorted by (-xp, id): rank lookups are a
+    binary search and top-N pages are a slice.
+    """
+
+    def __init__(self, rows):
+        self.xp = dict(rows)
+        self.keys = sorted((-xp, student_id) for student_id, xp in self.xp.items())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rank(self, student_id):
+        xp = self.xp.get(student_id)
+        if xp is None:
+            return None
+        return bisect_left(self.keys, (-xp, student_id)) + 1
+
+    def page(self, offset, limit):
+        return [
+            (offset + index + 1, student_id, -xp)
+            for index, (xp, student_id) in enumerate(self.keys[offset:offset + limit])
+        ]
+
+    def remove(self, student_id):
+        xp = self.xp.pop(student_id, None)
+        if xp is not None:
+            del self.keys[bisect_left(self.keys, (-xp, student_id))]
+
+    def update(self, student_id, xp):
+        self.remove(student_id)
+        self.xp[student_id] = xp
+        insort(self.keys, (-xp, student_id))
+
+
+class Leaderboard:
+    """
+    Process-local boards, built lazily from the (xp, id) index on Student.
+
+    xp changes made in this process are applied in place. Membership changes
+    bump the shared 'leaderboard' version and every process drops its
+    boards. Boards are also dropped after settings.LEADERBOARD_TTL seconds,
+    which bounds how stale xp written by another process can be.
+    """
+
+    def __init__(self):
+        self._boards = {}
+        self._version = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        version = get_version('leaderboard')
+        expired = time.monotonic() - self._built_at > settings.LEADERBOARD_TTL
+        if version != self._version or expired:
+            self._boards = {}
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def _load(self, scope, scope_id):
+        queryset = Student.objects.filter(is_active=True)
+        if scope == 'group':
+            queryset = queryset.filter(groups__group_id=scope_id, groups__status='active')
+        elif scope == 'course':
+            queryset = queryset.filter(groups__group__course_id=scope_id, groups__status='active')
+
+        return queryset.order_by('-xp', 'id').values_list('id', 'xp').distinct()
+
+    def board(self, scope='global', scope_id=None):
+        key = (scope, scope_id)
+        with self._lock:
+            self._sync()
+            board = self._boards.get(key)
+
+        if board is None:
+            board = Board(self._load(scope, scope_id))
+            with self._lock:
+                board = self._boards.setdefault(key, board)
+
+        return board
+
+    def students_changed(self, student_ids):
+        rows = dict(
+            Student.objects.filter(pk__in=student_ids, is_active=True).values_list('id', 'xp')
+        )
+
+        with self._lock:
+            self._sync()
+            for (scope, _), board in self._boards.items():
+                for student_id in student_ids:
+                    if student_id in rows and (scope == 'global' or student_id in board.xp):
+                        board.update(student_id, rows[student_id])
+                    elif student_id not in rows:
+                        board.remove(student_id)
+
+    def clear(self):
+        with self._lock:
+            self._boards = {}
+
+
+# One per shard, student ids repeat across them
+leaderboard = ShardLocal(Leaderboard)
@@ -0,0 +1,173 @@
+import json
+import math
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+
+from account.models import CustomUser, AdminTeacher, Student
+from account.serializers import RoleTokenObtainPairSerializer
+from config.middleware import QueryStats
+from main.models import Group, Room
+
+
+ADMIN_CHANGELISTS = (
+    'account/customuser', 'account/course', 'account/adminteacher', 'account/student',
+    'main/group', 'main/studentgroup', 'main/lesson', 'main/homework', 'main/attendence',
+)
+
+
+def benchmark_host():
+    # The test client's 'testserver' host is only allowed while testing
+    return next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and host[0] != '.'), 'localhost')
+
+
+def admin_token():
+    teacher = AdminTeacher.objects.filter(role='admin', is_active=True).select_related('user').first()
+    if teacher is None:
+        raise CommandError("No active admin to benchmark with, run generate_data first.")
+    return str(RoleTokenObtainPairSerializer.get_token(teacher.user).access_token)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the REST endpoints and admin changelists in-process against the current database and "
+        "reports p50/p95 latency, queries per request and peak memory, compared with a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help="Timed requests per endpoint.")
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline.")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="Allowed relative growth of latency and memory over the baseline.",
+        )
+
+    def handle(self, *args, **options):
+        api, admin = self.clients()
+        results = {}
+        for name, client, url in self.endpoints(api, admin):
+            results[name] = self.measure(client, url, options['requests'])
+            self.stdout.write(self.format_row(name, results[name]))
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}."))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(f"No baseline at {baseline_path}, run with --save-baseline to create one.")
+            return
+
+        regressions = self.compare(results, json.loads(baseline_path.read_text()), options['tolerance'])
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def clients(self):
+        host = benchmark_host()
+        api = Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f'Bearer {admin_token()}')
+
+        admin = None
+        superuser = CustomUser.objects.filter(is_superuser=True, is_active=True).first()
+        if superuser is None:
+            self.stdout.write("No superuser, skipping admin changelists.")
+        else:
+            admin = Client(HTTP_HOST=host)
+            admin.force_login(superuser)
+
+        return api, admin
+
+    def endpoints(self, api, admin):
+        group = Group.objects.order_by('id').first()
+        room_id = Room.objects.order_by('id').values_list('id', flat=True).first()
+        student_id = Student.objects.order_by('id').values_list('id', flat=True).first()
+        today = timezone.localdate()
+
+        yield 'teacher_admins', api, '/teacher_admins/'
+        yield 'leaderboard', api, '/leaderboard/'
+        if group:
+            yield 'leaderboard_group', api, f'/leaderboard/?scope=group&id={group.id}'
+            yield 'timetable_teacher', api, f'/timetable/teacher/{group.teacher_id}/'
+        if room_id:
+            yield 'timetable_room', api, f'/timetable/room/{room_id}/'
+            yield 'free_slots', api, (
+                f'/schedule/free_slots/?room={room_id}&date_from={today}'
+                f'&date_to={today + timedelta(days=6)}&duration=90'
+            )
+        if student_id:
+            yield 'timetable_student', api, f'/timetable/student/{student_id}/'
+
+        if admin:
+            for changelist in ADMIN_CHANGELISTS:
+                yield f"admin:{changelist}", admin, f'/admin/{changelist}/'
+
+    def request(self, client, url):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}.")
+        return stats
+
+    def measure(self, client, url, count):
+        # Warm up caches first, so p50 shows the steady state
+        self.request(client, url)
+
+        timings, queries = [], []
+        for _ in range(count):
+            start = time.perf_counter()
+            stats = self.request(client, url)
+            timings.append((time.perf_counter() - start) * 1000)
+            queries.append(stats.count)
+
+        # tracemalloc slows every allocation, so memory gets its own request
+        tracemalloc.start()
+        try:
+            self.request(client, url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def format_row(self, name, result):
+        return (
+            f"{name:<28} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+            f"{result['queries']:>4} queries  {result['peak_kib']:>10.1f} KiB"
+        )
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+            for metric in ('p95_ms', 'peak_kib'):
+                if result[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(f"{name}: {metric} {before[metric]} -> {result[metric]}")
+        return regressions
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+from account.models import Student
+from main.models import Room
+from .benchmark import admin_token, benchmark_host
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of concurrent requests to the sync endpoints through the WSGI application "
+        "(config/wsgi.py, one thread per request) with the same endpoints and their async versions through "
+        "the ASGI application (config/asgi.py, one event loop). See main/async_views.py for the findings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and server.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once.")
+
+    def handle(self, *args, **options):
+        from config.asgi import application as asgi_application
+        from config.wsgi import application as wsgi_application
+
+        self.host = benchmark_host()
+        self.authorization = f'Bearer {admin_token()}'
+        total, concurrency = options['requests'], options['concurrency']
+
+        for name, sync_url, async_url in self.endpoints():
+            wsgi = self.run_wsgi(wsgi_application, sync_url, total, concurrency)
+            asgi_sync = asyncio.run(self.run_asgi(asgi_application, sync_url, total, concurrency))
+            asgi = asyncio.run(self.run_asgi(asgi_application, async_url, total, concurrency))
+            self.stdout.write(
+                f"{name:<20} WSGI {wsgi:>8.1f} req/s   ASGI sync view {asgi_sync:>8.1f} req/s   "
+                f"ASGI async view {asgi:>8.1f} req/s   x{asgi / wsgi:.2f}"
+            )
+
+    def endpoints(self):
+        yield 'teacher_admins', '/teacher_admins/', '/async/teacher_admins/'
+        room_id = Room.objects.order_by('id').values_list('id', flat=True).first()
+        if room_id:
+            yield 'timetable_room', f'/timetable/room/{room_id}/', f'/async/timetable/room/{room_id}/'
+        student_id = Student.objects.order_by('id').values_list('id', flat=True).first()
+        if student_id:
+            yield (
+                'timetable_student',
+                f'/timetable/student/{student_id}/', f'/async/timetable/student/{student_id}/',
+            )
+
+    def run_wsgi(self, application, url, total, concurrency):
+        path = urlsplit(url)
+
+        def call(_):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path.path,
+                'QUERY_STRING': path.query,
+                'SERVER_NAME': self.host,
+                'SERVER_PORT': '80',
+                'HTTP_HOST': self.host,
+                'HTTP_AUTHORIZATION': self.authorization,
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': BytesIO(),
+                'wsgi.url_scheme': 'http',
+            }
+            statuses = []
+            body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                b''.join(body)
+            finally:
+                body.close()
+            return statuses[0].startswith('200')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            succeeded = sum(pool.map(call, range(total)))
+        return self.throughput(url, succeeded, total, time.perf_counter() - start)
+
+    async def run_asgi(self, application, url, total, concurrency):
+        path = urlsplit(url)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path.path,
+            'raw_path': path.path.encode(),
+            'query_string': path.query.encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode()), (b'authorization', self.authorization.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            messages, done = [], asyncio.Event()
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # Django listens for the disconnect until the response is sent
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                if message['type'] == 'http.response.body' and not message.get('more_body'):
+                    done.set()
+
+            async with semaphore:
+                await application(dict(scope), receive, send)
+            return messages[0]['status'] == 200
+
+        start = time.perf_counter()
+        succeeded = sum(await asyncio.gather(*(call() for _ in range(total))))
+        return self.throughput(url, succeeded, total, time.perf_counter() - start)
+
+    def throughput(self, url, succeeded, total, elapsed):
+        if succeeded != total:
+            self.stderr.write(f"{url}: {total - succeeded} of {total} requests failed.")
+        return total / elapsed
@@ -0,0 +1,150 @@
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from main.models import Attendence, Homework
+from main.serializers import RollCallSerializer
+from main.services import grade_homeworks
+from .benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent roll calls (RollCallSerializer) and grading (grade_homeworks) against copies of the "
+        "database, once per SQLITE_PROFILES entry, and reports committed requests per second and "
+        "'database is locked' failures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Threads writing at once.")
+        parser.add_argument('--transactions', type=int, default=50, help="Transactions per writer.")
+        parser.add_argument('--profiles', nargs='+', default=list(settings.SQLITE_PROFILES))
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        source = connections['default']
+        if source.vendor != 'sqlite':
+            raise CommandError("The default database is not SQLite.")
+        unknown = set(options['profiles']) - set(settings.SQLITE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}.")
+        if settings.DATABASE_REPLICAS or settings.BRANCH_DATABASES:
+            raise CommandError("Run without REPLICAS and BRANCHES, the copies replace the default database only.")
+
+        roll_calls = self.roll_calls()
+        homework_ids = list(Homework.objects.values_list('id', flat=True)[:10000])
+        if not roll_calls or not homework_ids:
+            raise CommandError("No attendences or homeworks to write, run generate_data first.")
+
+        # Next to the database, so commits pay for the same disk
+        with tempfile.TemporaryDirectory(dir=Path(source.settings_dict['NAME']).parent) as directory:
+            for profile in options['profiles']:
+                path = Path(directory) / f'{profile}.sqlite3'
+                # Every profile starts from the same data and journal mode
+                with closing(sqlite3.connect(source.settings_dict['NAME'])) as original, closing(sqlite3.connect(path)) as copy:
+                    original.backup(copy)
+                with self.default_database(path, profile):
+                    # Switching to WAL needs the database to itself, done once
+                    # here like the first worker of a deployment would
+                    connections['default'].ensure_connection()
+                    result = self.run(roll_calls, homework_ids, options)
+                self.stdout.write(
+                    f"{profile:<12} {result['tps']:>8.1f} tx/s  p95 {result['p95_ms']:>8.1f} ms  "
+                    f"{result['locked']:>5} locked of {result['total']}"
+                )
+
+    @contextmanager
+    def default_database(self, path, profile):
+        """
+        Points the default database at `path` with `profile`, so the writer
+        threads run the application's own code paths against the copy.
+        """
+        original = connections.settings['default']
+        connections['default'].close()
+        del connections['default']
+        connections.settings['default'] = {**original, 'NAME': str(path), 'OPTIONS': {}, **settings.SQLITE_PROFILES[profile]}
+        try:
+            yield
+        finally:
+            connections['default'].close()
+            del connections['default']
+            connections.settings['default'] = original
+
+    def roll_calls(self):
+        lessons = {}
+        for lesson_id, student_id in Attendence.objects.values_list('lesson_id', 'student_id')[:20000]:
+            lessons.setdefault(lesson_id, []).append(student_id)
+        return list(lessons.items())
+
+    def run(self, roll_calls, homework_ids, options):
+        count = options['transactions']
+        barrier = threading.Barrier(options['writers'])
+        timings, failures, lock = [], [], threading.Lock()
+
+        def writer(seed):
+            rng = random.Random(seed)
+            own_timings, locked = [], 0
+            barrier.wait()
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    try:
+                        if rng.random() < 0.5:
+                            self.roll_call(rng, *rng.choice(roll_calls))
+                        else:
+                            self.grade(rng, rng.sample(homework_ids, min(5, len(homework_ids))))
+                    except OperationalError as error:
+                        if 'locked' not in str(error):
+                            raise
+                        locked += 1
+                    else:
+                        own_timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections['default'].close()
+            with lock:
+                timings.extend(own_timings)
+                failures.append(locked)
+
+        threads = [
+            threading.Thread(target=writer, args=(options['seed'] + number,))
+            for number in range(options['writers'])
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            'tps': len(timings) / elapsed,
+            'p95_ms': percentile(timings, 95) if timings else 0.0,
+            'locked': sum(failures),
+            'total': count * options['writers'],
+        }
+
+    def roll_call(self, rng, lesson_id, student_ids):
+        # What POST /attendences/roll_call/ runs
+        serializer = RollCallSerializer(data={
+            'lesson': lesson_id,
+            'statuses': {student_id: rng.choice(('came', 'absent', 'late')) for student_id in student_ids},
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    def grade(self, rng, homework_ids):
+        # What POST /homeworks/grade/ runs after validation: reads the
+        # homeworks, then writes them, the read-then-write transaction that
+        # fails right away under deferred BEGIN
+        grade_homeworks([
+            {'homework': homework_id, 'status': 'done', 'ball': rng.randint(0, 100), 'xp': rng.randint(0, 50), 'coins': 1}
+            for homework_id in homework_ids
+        ])
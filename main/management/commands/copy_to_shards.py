@@ -0,0 +1,101 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+
+from account.models import AdminTeacher, Student
+from config.db_routers import fan_out
+from main.models import Attendence, Group, Homework, Lesson, Room, StudentGroup, VideoUpload, VideoUploadChunk
+
+
+# Branch models in insert order, with the lookup that gives a row's branch.
+# ScheduleChange is left behind: the indexes build from the groups themselves.
+BRANCH_LOOKUPS = {
+    Room: 'branch',
+    Student: 'branch',
+    AdminTeacher: 'branch',
+    Group: 'branch',
+    Group.days.through: 'group__branch',
+    StudentGroup: 'group__branch',
+    Lesson: 'group__branch',
+    Homework: 'lesson__group__branch',
+    Attendence: 'lesson__group__branch',
+    VideoUpload: 'lesson__group__branch',
+    VideoUploadChunk: 'upload__lesson__group__branch',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the branch rows of the default database into the shard of their branch. "
+        "Run once, after migrating the shards and before serving requests with BRANCHES."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        if not settings.BRANCH_DATABASES:
+            raise CommandError("No BRANCH_DATABASES, set BRANCHES.")
+        self.check_rows()
+
+        def copy(alias):
+            branches = [branch for branch, database in settings.BRANCH_DATABASES.items() if database == alias]
+            copied = {}
+            with transaction.atomic(using=alias):
+                for model, lookup in BRANCH_LOOKUPS.items():
+                    rows = (
+                        model.objects.using(DEFAULT_DB_ALIAS)
+                        .filter(**{f'{lookup}__in': branches})
+                        .order_by('pk')
+                        .iterator(chunk_size=options['batch_size'])
+                    )
+                    copied[model] = 0
+                    while batch := list(islice(rows, options['batch_size'])):
+                        model.objects.using(alias).bulk_create(batch)
+                        copied[model] += len(batch)
+
+                # Keep new ids clear of the copied ones where sequences are separate
+                with connections[alias].cursor() as cursor:
+                    for sql in connections[alias].ops.sequence_reset_sql(no_style(), list(BRANCH_LOOKUPS)):
+                        cursor.execute(sql)
+            return alias, copied
+
+        for alias, copied in fan_out(copy):
+            rows = ', '.join(f'{count} {model._meta.verbose_name_plural}' for model, count in copied.items() if count)
+            self.stdout.write(f"{alias}: {rows or 'nothing'}")
+        self.stdout.write(self.style.SUCCESS("Copied. The branch tables of the default database are no longer read."))
+
+    def check_rows(self):
+        problems = []
+        for alias in dict.fromkeys(settings.BRANCH_DATABASES.values()):
+            filled = [model._meta.label for model in BRANCH_LOOKUPS if model.objects.using(alias).exists()]
+            if filled:
+                problems.append(f"{alias} already has rows in {', '.join(filled)}.")
+
+        for model, lookup in BRANCH_LOOKUPS.items():
+            rows = model.objects.using(DEFAULT_DB_ALIAS)
+            orphans = rows.filter(**{f'{lookup}__isnull': True}).count()
+            if orphans:
+                problems.append(f"{orphans} {model._meta.label} rows have no branch.")
+            if lookup == 'branch':
+                unknown = set(rows.exclude(branch__in=settings.BRANCH_DATABASES).values_list('branch', flat=True))
+                if unknown:
+                    problems.append(f"{model._meta.label} has rows of branches without a database: {', '.join(sorted(unknown))}.")
+
+            # A row and the branch rows it points to have to end up in one shard
+            for field in model._meta.concrete_fields:
+                if field.is_relation and field.related_model in BRANCH_LOOKUPS:
+                    split = (
+                        rows.filter(**{f'{field.name}__isnull': False})
+                        .exclude(**{f'{field.name}__{BRANCH_LOOKUPS[field.related_model]}': F(lookup)})
+                        .count()
+                    )
+                    if split:
+                        problems.append(f"{split} {model._meta.label} rows are in another branch than their {field.name}.")
+
+        if problems:
+            raise CommandError(' '.join(problems))
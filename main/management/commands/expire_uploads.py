@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = "Fails abandoned video uploads and deletes their part files. Meant to run from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=settings.VIDEO_UPLOAD_EXPIRY_HOURS,
+            help="Hours without a chunk after which an upload is abandoned.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = expire_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} abandoned part files."))
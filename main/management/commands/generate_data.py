@@ -0,0 +1,234 @@
+import random
+from collections import defaultdict
+from datetime import date, time, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from account.models import CustomUser, CourseType, Course, AdminTeacher, Student
+from main.caching import bump_version
+from main.models import Weekday, Room, Group, StudentGroup, Lesson, Homework, Attendence
+from main.schedule import log_group_changes
+from main.services import term_dates
+
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+FIRST_NAMES = ('Ali', 'Vali', 'Aziz', 'Dilnoza', 'Madina', 'Sardor', 'Jasur', 'Malika', 'Bekzod', 'Nodira')
+LAST_NAMES = ('Karimov', 'Rahimov', 'Toshmatov', 'Aliyeva', 'Yusupova', 'Ergashev', 'Saidov', 'Qodirova')
+COURSE_TYPES = ('Frontend', 'Backend', 'Mobile', 'Design', 'English')
+SLOTS = [(time(hour), time(hour + 1, 30)) for hour in range(8, 21, 2)]
+DAY_PATTERNS = ((0, 2, 4), (1, 3, 5))
+# Every room (and teacher) runs one group per slot and day pattern
+GROUPS_PER_ROOM = len(SLOTS) * len(DAY_PATTERNS)
+TERM = timedelta(days=180)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Generates realistic synthetic data in bulk for load testing. Every count is multiplied by --scale."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50_000, help="Students, each with their own user.")
+        parser.add_argument('--teachers', type=int, default=500)
+        parser.add_argument('--groups', type=int, default=2_000)
+        parser.add_argument('--lessons', type=int, default=100_000)
+        parser.add_argument('--homeworks', type=int, default=5_000_000)
+        parser.add_argument('--attendences', type=int, default=5_000_000)
+        parser.add_argument('--scale', type=float, default=1.0)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        counts = {
+            name: max(int(options[name] * scale), 1)
+            for name in ('users', 'teachers', 'groups', 'lessons', 'homeworks', 'attendences')
+        }
+        if counts['groups'] > counts['lessons']:
+            raise CommandError("Every group needs at least one lesson.")
+        if counts['groups'] > GROUPS_PER_ROOM * counts['teachers']:
+            raise CommandError(f"A teacher can run at most {GROUPS_PER_ROOM} groups without double booking.")
+
+        start = date.today().replace(day=1)
+        self.term = (start, start + TERM)
+        term = Group(start_date=start, end_date=start + TERM)
+        per_term = min(len(list(term_dates(term, pattern))) for pattern in DAY_PATTERNS)
+        if -(-counts['lessons'] // counts['groups']) > per_term:
+            raise CommandError(f"A group has at most {per_term} lessons in a term.")
+
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Numbers used by earlier runs are always below the current max id
+        self.run = (CustomUser.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        self.next_user = self.run
+
+        weekdays = self.weekdays()
+        courses = self.courses()
+        teachers = self.teachers(counts['teachers'], courses)
+        students = self.students(counts['users'])
+        groups = self.groups(counts['groups'], courses, teachers, weekdays)
+
+        per_lesson = max(counts['homeworks'], counts['attendences']) // counts['lessons'] + 1
+        members = self.members(groups, students, min(per_lesson, len(students)))
+        self.lessons(counts['lessons'], groups, weekdays)
+        self.homeworks_and_attendences(members, counts['homeworks'], counts['attendences'])
+
+        bump_version('leaderboard')
+        log_group_changes(group.id for group in groups)
+        self.stdout.write(self.style.SUCCESS("Synthetic data generated."))
+
+    def bulk_create(self, model, objects, keep=True):
+        created, count = [], 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            count += len(batch)
+            if keep:
+                created += batch
+        self.stdout.write(f"{model.__name__}: {count}")
+        return created
+
+    def weekdays(self):
+        for number, name in enumerate(WEEKDAYS):
+            Weekday.objects.update_or_create(name=name, defaults={'number': number})
+        return list(Weekday.objects.filter(number__isnull=False).order_by('number'))
+
+    def courses(self):
+        course_types = self.bulk_create(CourseType, (CourseType(name=name) for name in COURSE_TYPES))
+        return self.bulk_create(Course, (
+            Course(name=f"{course_type.name} {level}", price=500_000 + 100_000 * level, course_type=course_type)
+            for course_type in course_types for level in range(1, 5)
+        ))
+
+    def users(self, count):
+        # Hashing once keeps generation fast, every user gets the same password
+        password = make_password('Passw0rd!')
+        numbers = range(self.next_user, self.next_user + count)
+        self.next_user += count
+        return self.bulk_create(CustomUser, (
+            CustomUser(
+                phone=f"+998{number:09d}",
+                email=f"user{number}@example.com",
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                password=password,
+            )
+            for number in numbers
+        ))
+
+    def teachers(self, count, courses):
+        users = self.users(count)
+        roles = ['admin'] + ['main_teacher', 'assistant_teacher'] * count
+        return self.bulk_create(AdminTeacher, (
+            AdminTeacher(user=user, role=role, course=self.random.choice(courses))
+            for user, role in zip(users, roles)
+        ))
+
+    def students(self, count):
+        users = self.users(count)
+        return self.bulk_create(Student, (
+            Student(
+                user=user,
+                gender=self.random.choice('MF'),
+                year=self.random.randint(2000, 2015),
+                level=self.random.randint(1, 11),
+                xp=self.random.randint(0, 10_000),
+                coins=self.random.randint(0, 1_000),
+            )
+            for user in users
+        ))
+
+    def groups(self, count, courses, teachers, weekdays):
+        # Group n gets its own (room, slot, days) cell, and every group in a
+        # room has that room's teacher, so nobody is booked twice
+        rooms = self.bulk_create(Room, (
+            Room(name=f"R{self.run}-{n}") for n in range(-(-count // GROUPS_PER_ROOM))
+        ))
+
+        def cell(n):
+            room, n = divmod(n, GROUPS_PER_ROOM)
+            slot, pattern = divmod(n, len(DAY_PATTERNS))
+            return room, SLOTS[slot], DAY_PATTERNS[pattern]
+
+        groups = self.bulk_create(Group, (
+            Group(
+                name=f"G{self.run}-{n}",
+                course=self.random.choice(courses),
+                teacher=teachers[cell(n)[0] % len(teachers)],
+                room=rooms[cell(n)[0]],
+                start_date=self.term[0],
+                end_date=self.term[1],
+                start_time=cell(n)[1][0],
+                end_time=cell(n)[1][1],
+            )
+            for n in range(count)
+        ))
+        self.bulk_create(Group.days.through, (
+            Group.days.through(group=group, weekday=weekdays[number])
+            for n, group in enumerate(groups)
+            for number in cell(n)[2]
+        ), keep=False)
+        return groups
+
+    def members(self, groups, students, per_group):
+        members = {
+            group.id: [students[(n * per_group + k) % len(students)] for k in range(per_group)]
+            for n, group in enumerate(groups)
+        }
+        self.bulk_create(StudentGroup, (
+            StudentGroup(student=student, group_id=group_id)
+            for group_id, group_students in members.items() for student in group_students
+        ), keep=False)
+        return members
+
+    def lessons(self, count, groups, weekdays):
+        per_group, extra = divmod(count, len(groups))
+        numbers = defaultdict(set)
+        through = Group.days.through.objects.filter(group__in=groups).values_list('group_id', 'weekday__number')
+        for group_id, number in through.iterator():
+            numbers[group_id].add(number)
+
+        def rows():
+            for n, group in enumerate(groups):
+                dates = islice(term_dates(group, numbers[group.id]), per_group + (n < extra))
+                for k, lesson_date in enumerate(dates):
+                    yield Lesson(
+                        name=f"Lesson {k + 1}",
+                        group=group,
+                        task_text="Solve the exercises from the lesson.",
+                        task_file="lessons/sample.pdf",
+                        date=lesson_date,
+                        day=weekdays[lesson_date.weekday()],
+                        is_published=lesson_date <= date.today(),
+                    )
+
+        self.bulk_create(Lesson, rows(), keep=False)
+
+    def homeworks_and_attendences(self, members, homeworks, attendences):
+        def pairs():
+            lessons = Lesson.objects.filter(group_id__in=members).order_by('id').values_list('id', 'group_id')
+            for lesson_id, group_id in lessons.iterator():
+                for student in members[group_id]:
+                    yield lesson_id, group_id, student
+
+        self.bulk_create(Homework, (
+            Homework(
+                lesson_id=lesson_id, student=student, group_id=group_id,
+                text="Homework", file="homeworks/sample.pdf",
+                status=self.random.choice(('not_done', 'waiting', 'done')),
+                ball=self.random.randint(0, 100),
+            )
+            for lesson_id, group_id, student in islice(pairs(), homeworks)
+        ), keep=False)
+        self.bulk_create(Attendence, (
+            Attendence(lesson_id=lesson_id, student=student, status=self.random.choice(('came', 'absent', 'late')))
+            for lesson_id, _, student in islice(pairs(), attendences)
+        ), keep=False)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from account.models import Student
+from main.caching import bump_version
+from main.models import Homework
+
+
+class Command(BaseCommand):
+    help = "Drops the cached leaderboards in every process, optionally recomputing student totals first."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recompute-totals',
+            action='store_true',
+            help="Recompute Student.xp and Student.coins from graded homeworks.",
+        )
+
+    def handle(self, *args, **options):
+        if options['recompute_totals']:
+            done = Homework.objects.filter(student=OuterRef('pk'), status='done').values('student')
+            with transaction.atomic():
+                updated = Student.objects.update(
+                    xp=Coalesce(Subquery(done.annotate(total=Sum('xp')).values('total')), Value(0)),
+                    coins=Coalesce(Subquery(done.annotate(total=Sum('coins')).values('total')), Value(0)),
+                )
+            self.stdout.write(f"Recomputed totals for {updated} students.")
+
+        version = bump_version('leaderboard')
+        self.stdout.write(self.style.SUCCESS(f"Leaderboards invalidated (version {version})."))
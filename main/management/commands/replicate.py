@@ -0,0 +1,37 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies every SQLite database with DATABASE_REPLICAS onto its replicas with the online backup API, "
+        "once or every --interval seconds. A stand-in for real replication when trying replicas locally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help="Seconds between copies, 0 copies once.")
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No DATABASE_REPLICAS, set REPLICAS=1.")
+        for alias, replicas in settings.DATABASE_REPLICAS.items():
+            for database in (alias, *replicas):
+                if connections[database].vendor != 'sqlite':
+                    raise CommandError(f"{database!r} is not SQLite, replicate it with the database's own tools.")
+
+        while True:
+            start = time.perf_counter()
+            for alias, replicas in settings.DATABASE_REPLICAS.items():
+                with closing(sqlite3.connect(connections[alias].settings_dict['NAME'])) as primary:
+                    for replica in replicas:
+                        with closing(sqlite3.connect(connections[replica].settings_dict['NAME'])) as copy:
+                            primary.backup(copy)
+            self.stdout.write(f"Replicated {len(settings.DATABASE_REPLICAS)} databases in {time.perf_counter() - start:.2f}s")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_alter_student_level'),
+        ('main', '0007_homework_answer_homework_ball'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='homework',
+            options={'ordering': ['-time', '-id'], 'verbose_name': 'homework', 'verbose_name_plural': 'homeworks'},
+        ),
+        migrations.AddIndex(
+            model_name='homework',
+            index=models.Index(fields=['-time', '-id'], name='homework_time_id_idx'),
+        ),
+    ]
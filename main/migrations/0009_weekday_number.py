@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:53
+
+import django.core.validators
+from django.db import migrations, models
+
+
+WEEKDAY_NAMES = (
+    ('monday', 'mon', 'dushanba', 'понедельник', 'пн'),
+    ('tuesday', 'tue', 'seshanba', 'вторник', 'вт'),
+    ('wednesday', 'wed', 'chorshanba', 'среда', 'ср'),
+    ('thursday', 'thu', 'payshanba', 'четверг', 'чт'),
+    ('friday', 'fri', 'juma', 'пятница', 'пт'),
+    ('saturday', 'sat', 'shanba', 'суббота', 'сб'),
+    ('sunday', 'sun', 'yakshanba', 'воскресенье', 'вс'),
+)
+
+
+def set_weekday_numbers(apps, schema_editor):
+    Weekday = apps.get_model('main', 'Weekday')
+    numbers = {name: number for number, names in enumerate(WEEKDAY_NAMES) for name in names}
+    used = set()
+    for weekday in Weekday.objects.all():
+        number = numbers.get(weekday.name.strip().lower())
+        if number is not None and number not in used:
+            used.add(number)
+            weekday.number = number
+            weekday.save(update_fields=['number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_homework_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weekday',
+            name='number',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, unique=True, validators=[django.core.validators.MaxValueValidator(6)]),
+        ),
+        migrations.RunPython(set_weekday_numbers, migrations.RunPython.noop, hints={'model_name': 'weekday'}),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_weekday_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['group', 'date'], name='lesson_group_date_idx'),
+        ),
+    ]
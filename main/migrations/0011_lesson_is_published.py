@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_lesson_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='is_published',
+            field=models.BooleanField(default=False),
+        ),
+    ]
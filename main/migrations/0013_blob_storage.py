@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:11
+
+import main.models
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_video_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'blob',
+                'verbose_name_plural': 'blobs',
+                'db_table': 'blob',
+            },
+        ),
+        migrations.AlterField(
+            model_name='homework',
+            name='file',
+            field=models.FileField(storage=main.storage.get_blob_storage, upload_to=main.models.homework_file_path),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='task_file',
+            field=models.FileField(storage=main.storage.get_blob_storage, upload_to=main.models.lesson_file_path),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:44
+
+import config.db_routers
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_branch'),
+        ('main', '0013_blob_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='branch',
+            field=models.CharField(db_index=True, default=config.db_routers.current_branch, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='branch',
+            field=models.CharField(db_index=True, default=config.db_routers.current_branch, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='group',
+            name='course',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='groups', to='account.course'),
+        ),
+        migrations.AlterField(
+            model_name='group',
+            name='days',
+            field=models.ManyToManyField(db_constraint=False, to='main.weekday'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='day',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lessons', to='main.weekday'),
+        ),
+        migrations.AlterField(
+            model_name='videoupload',
+            name='created_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:30
+
+import main.models
+import main.storage
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_schedulechange'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='homework',
+            name='file',
+            field=main.storage.BlobFileField(storage=main.storage.get_blob_storage, upload_to=main.models.homework_file_path),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='task_file',
+            field=main.storage.BlobFileField(storage=main.storage.get_blob_storage, upload_to=main.models.lesson_file_path),
+        ),
+    ]
@@ -1,10 +1,18 @@
+import uuid
+
+from django.conf import settings
 from django.core.validators import MaxValueValidator
 from django.db import models
 
+from config.db_routers import current_branch
+from .storage import BlobFileField
+
 # Create your models here.
 
 class Weekday(models.Model):
     name = models.CharField(max_length=10, unique=True)
+    # date.weekday() of this day: 0 is Monday, 6 is Sunday
+    number = models.PositiveSmallIntegerField(unique=True, null=True, blank=True, validators=[MaxValueValidator(6)])
 
     def __str__(self):
         return self.name
@@ -17,6 +25,7 @@ class Weekday(models.Model):
 
 class Room(models.Model):
     name = models.CharField(max_length=20, unique=True)
+    branch = models.CharField(max_length=20, default=current_branch, db_index=True)
 
     def __str__(self):
         return self.name
@@ -29,17 +38,21 @@ class Room(models.Model):
 
 class Group(models.Model):
     name = models.CharField(max_length=20, unique=True)
-    course = models.ForeignKey('account.Course', on_delete=models.SET_NULL, related_name='groups', null=True, blank=True)
+    # Courses and weekdays are shared, groups live in their branch's database
+    # Set to NULL by account.signals when the course goes, in every shard
+    course = models.ForeignKey('account.Course', on_delete=models.DO_NOTHING, related_name='groups', null=True, blank=True, db_constraint=False)
     teacher = models.ForeignKey('account.AdminTeacher', on_delete=models.SET_NULL, related_name='groups', null=True, blank=True)
     start_date = models.DateField()
     end_date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField()
     room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, related_name='groups', blank=True)
-    days = models.ManyToManyField("main.Weekday")
+    days = models.ManyToManyField("main.Weekday", db_constraint=False)
+    branch = models.CharField(max_length=20, default=current_branch, db_index=True)
 
     def __str__(self):
-        return f'{self.name} - {self.start_time} - {self.end_time} - {self.room.name}'
+        room = self.room.name if self.room_id else '-'
+        return f'{self.name} - {self.start_time} - {self.end_time} - {room}'
 
     class Meta:
         verbose_name = 'group'
@@ -61,7 +74,7 @@ class StudentGroup(models.Model):
     status = models.CharField(max_length=20, choices=STATUS, default='active')
 
     def __str__(self):
-        return f'{self.student.fullname} - {self.group.name}'
+        return f'{self.student} - {self.group.name}'
 
     class Meta:
         verbose_name = 'student_group'
@@ -69,35 +82,122 @@ class StudentGroup(models.Model):
         db_table = 'student_group'
 
 
+class ScheduleChange(models.Model):
+    """
+    A group whose schedule or members changed. The indexes in main.schedule
+    apply the groups logged since they last looked, whichever process wrote
+    them, see main.signals.
+    """
+    group_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.group_id} - {self.created_at}'
+
+    class Meta:
+        verbose_name = 'schedule_change'
+        verbose_name_plural = 'schedule_changes'
+        db_table = 'schedule_change'
+
+
 def lesson_video_path(instance, filename):
     instance_group_name = instance.group.name.replace(" ", "_")
-    return f'lessons/{instance_group_name}/videos/'
+    return f'lessons/{instance_group_name}/videos/{filename}'
 
 def lesson_file_path(instance, filename):
-    instance_group_name = instance.group.name.replace(" ", "_")
-    return f'lessons/{instance_group_name}/files/'
+    # Only the extension survives, task files are stored by content
+    return f'lessons/{instance.group_id}/files/{filename}'
 
 class Lesson(models.Model):
     name = models.CharField(max_length=100)
     group = models.ForeignKey('main.Group', on_delete=models.CASCADE, related_name='lessons')
     video = models.FileField(upload_to=lesson_video_path, null=True)
     task_text = models.TextField()
-    task_file = models.FileField(upload_to=lesson_file_path)
-    day = models.ForeignKey('main.Weekday', on_delete=models.SET_NULL, related_name='lessons', null=True, blank=True)
+    task_file = BlobFileField(upload_to=lesson_file_path)
+    day = models.ForeignKey('main.Weekday', on_delete=models.SET_NULL, related_name='lessons', null=True, blank=True, db_constraint=False)
+    date = models.DateField(null=True, blank=True)
+    is_published = models.BooleanField(default=False)
 
     def __str__(self):
-        return f'{self.name} - {self.group.course.name} - {self.group.name} - {self.group.room} - {self.group.start_time} - {self.group.end_time}'
+        group = self.group
+        course = group.course.name if group.course_id else '-'
+        room = group.room.name if group.room_id else '-'
+        return f'{self.name} - {course} - {group.name} - {room} - {group.start_time} - {group.end_time}'
 
     class Meta:
         verbose_name = 'lesson'
         verbose_name_plural = 'lessons'
         db_table = 'lesson'
+        indexes = [
+            models.Index(fields=['group', 'date'], name='lesson_group_date_idx'),
+        ]
+
+
+class VideoUpload(models.Model):
+    STATUS = (
+        ('uploading', 'Uploading'),
+        ('assembling', 'Assembling'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    lesson = models.ForeignKey('main.Lesson', on_delete=models.CASCADE, related_name='video_uploads')
+    # Set to NULL by account.signals when the user goes, in every shard
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def __str__(self):
+        return f'{self.filename} - {self.status}'
+
+    class Meta:
+        verbose_name = 'video_upload'
+        verbose_name_plural = 'video_uploads'
+        db_table = 'video_upload'
+
+
+class VideoUploadChunk(models.Model):
+    upload = models.ForeignKey('main.VideoUpload', on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('upload', 'index')
+        db_table = 'video_upload_chunk'
+
+
+class Blob(models.Model):
+    """A file stored by content in main.storage, with its reference count."""
+    hash = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} - {self.refs}'
+
+    class Meta:
+        verbose_name = 'blob'
+        verbose_name_plural = 'blobs'
+        db_table = 'blob'
 
 
 def homework_file_path(instance, filename):
-    student_name = instance.student.fullname.replace(" ", "_")
-    group_name = instance.group.name.replace(" ", "_")
-    return f'homeworks/{student_name}/{group_name}/{filename}'
+    # Ids only, so saving a homework never loads its student or group. Only
+    # the extension survives, homework files are stored by content
+    return f'homeworks/{instance.student_id}/{instance.group_id}/{filename}'
 
 class Homework(models.Model):
     HOMEWORK_STATUS = (
@@ -114,20 +214,23 @@ class Homework(models.Model):
     text = models.TextField()
     answer = models.TextField(null=True, blank=True)
     ball = models.PositiveBigIntegerField(validators=[MaxValueValidator(100)], default=0)
-    file = models.FileField(upload_to=homework_file_path)
+    file = BlobFileField(upload_to=homework_file_path)
     xp = models.PositiveIntegerField(default=0)
     coins = models.PositiveIntegerField(default=0)
     time = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=HOMEWORK_STATUS)
 
     def __str__(self):
-        return f'{self.student.fullname} - {self.group.name} - {self.lesson.name} - {self.status}'
+        return f'{self.student} - {self.group.name} - {self.lesson.name} - {self.status}'
 
     class Meta:
         verbose_name = 'homework'
         verbose_name_plural = 'homeworks'
         db_table = 'homework'
-        ordering = ['-time']
+        ordering = ['-time', '-id']
+        indexes = [
+            models.Index(fields=['-time', '-id'], name='homework_time_id_idx'),
+        ]
 
 
 
@@ -144,7 +247,7 @@ class Attendence(models.Model):
     status = models.CharField(max_length=20, choices=ATTENDENCE_STATUS)
 
     def __str__(self):
-        return f'{self.student.fullname} - {self.lesson.name} - {self.status}'
+        return f'{self.student} - {self.lesson.name} - {self.status}'
 
     class Meta:
         unique_together = ('student', 'lesson')
@@ -0,0 +1,63 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, Q, Sum
+
+from account.models import AdminTeacher, Student
+from config.db_routers import fan_out
+from .models import Attendence, Group, Homework, Room
+
+
+# (name, model, path to the branch, rows counted)
+COUNTS = (
+    ('students', Student, 'branch', Q(is_active=True)),
+    ('teachers', AdminTeacher, 'branch', Q(is_active=True)),
+    ('groups', Group, 'branch', Q()),
+    ('rooms', Room, 'branch', Q()),
+)
+
+
+def shard_totals(alias):
+    """Counters of every branch with rows in the database `alias`, one GROUP BY query per table."""
+    totals = defaultdict(Counter)
+    for name, model, branch, condition in COUNTS:
+        rows = model.objects.using(alias).filter(condition).values_list(branch).annotate(Count('pk')).order_by()
+        for value, count in rows:
+            totals[value][name] += count
+
+    rows = Attendence.objects.using(alias).values_list('lesson__group__branch', 'status').annotate(Count('pk')).order_by()
+    for value, status, count in rows:
+        totals[value][status] += count
+
+    rows = (
+        Homework.objects.using(alias).filter(status='done')
+        .values_list('group__branch').annotate(Count('pk'), Sum('ball')).order_by()
+    )
+    for value, count, ball in rows:
+        totals[value]['homeworks_done'] += count
+        totals[value]['ball'] += ball
+
+    return totals
+
+
+def branch_report():
+    """
+    Per-branch and overall counters, collected from all shards in parallel
+    and merged. Averages are computed from the merged sums.
+    """
+    merged = defaultdict(Counter)
+    for totals in fan_out(shard_totals):
+        for branch, counters in totals.items():
+            merged[branch].update(counters)
+
+    def row(counters):
+        data = {name: counters[name] for name, *_ in COUNTS}
+        data['homeworks_done'] = counters['homeworks_done']
+        data['attendences'] = {status: counters[status] for status, _ in Attendence.ATTENDENCE_STATUS}
+        done = counters['homeworks_done']
+        data['average_ball'] = round(counters['ball'] / done, 2) if done else None
+        return data
+
+    return {
+        'branches': [{'branch': branch, **row(merged[branch])} for branch in sorted(merged)],
+        'total': row(sum(merged.values(), Counter())),
+    }
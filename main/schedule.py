@@ -0,0 +1,311 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db.models import Max
+from django.utils import timezone
+
+from config.db_routers import ShardLocal
+from .models import Group, ScheduleChange, StudentGroup
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+class IntervalIndex:
+    """
+    Intervals of one resource on one weekday, sorted by start minute, with
+    the running maximum of their ends. Intervals that overlap [start, end)
+    all start before `end` (one bisect), and scanning back can stop as soon
+    as the running maximum end no longer reaches `start`.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals)
+        self.starts = [interval[0] for interval in self.intervals]
+        self.max_ends = list(accumulate((interval[1] for interval in self.intervals), max))
+
+    def overlapping(self, start, end, start_date, end_date):
+        index = bisect_left(self.starts, end) - 1
+        while index >= 0 and self.max_ends[index] > start:
+            interval_start, interval_end, group_start, group_end, group_id = self.intervals[index]
+            if interval_end > start and group_start <= end_date and start_date <= group_end:
+                yield group_id
+            index -= 1
+
+
+class GroupIndex:
+    """
+    Base of the process-local group indexes below. They are built once a
+    day and then follow ScheduleChange: every process reloads just the
+    groups changed since it last looked, whichever process changed them,
+    for one query when nothing did. Subclasses implement _build(today) and
+    _reload(group_ids, today).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._seen = None
+        self._built_on = None
+
+    def sync(self):
+        today = timezone.localdate()
+        with self._lock:
+            if today != self._built_on:
+                # Changes logged while building are reloaded again next time, which is harmless
+                self._seen = ScheduleChange.objects.aggregate(last=Max('pk'))['last'] or 0
+                self._build(today)
+                self._built_on = today
+                return
+
+            changes = list(ScheduleChange.objects.filter(pk__gt=self._seen).order_by('pk').values_list('pk', 'group_id'))
+            if changes:
+                self._seen = changes[-1][0]
+                self._reload({group_id for _, group_id in changes}, today)
+
+
+def log_group_changes(group_ids, using=None):
+    """Tells the indexes of every process that these groups changed, see GroupIndex."""
+    changes = ScheduleChange.objects.using(using)
+    changes.bulk_create(ScheduleChange(group_id=group_id) for group_id in group_ids)
+    # Indexes are rebuilt daily, older changes are of no use to any
+    changes.filter(created_at__lt=timezone.now() - timedelta(days=2)).delete()
+
+
+class ScheduleIndex(GroupIndex):
+    """
+    Per-weekday interval indexes of active groups (not finished yet) for
+    every room, teacher and student. A changed group is taken out of the
+    indexes it was in and put back into the ones it is in now, and only
+    those are re-sorted.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buckets = {}
+        self.intervals = defaultdict(dict)
+        self.group_keys = {}
+        self.groups = {}
+        self.members = {}
+
+    def _load(self, today, **filters):
+        groups = {
+            group['id']: group for group in
+            Group.objects.filter(end_date__gte=today, **filters).values(
+                'id', 'name', 'room_id', 'teacher_id', 'start_date', 'end_date', 'start_time', 'end_time'
+            )
+        }
+        for group in groups.values():
+            group['days'] = []
+        for group_id, weekday_id in Group.days.through.objects.filter(group_id__in=groups).values_list('group_id', 'weekday_id'):
+            groups[group_id]['days'].append(weekday_id)
+
+        members = defaultdict(list)
+        for group_id, student_id in StudentGroup.objects.filter(status='active', group_id__in=groups).values_list('group_id', 'student_id'):
+            members[group_id].append(student_id)
+        return groups, members
+
+    def _add(self, group, members):
+        resources = [('room', group['room_id']), ('teacher', group['teacher_id'])]
+        resources += [('student', student_id) for student_id in members]
+        interval = (
+            to_minutes(group['start_time']), to_minutes(group['end_time']),
+            group['start_date'], group['end_date'], group['id'],
+        )
+        keys = [
+            (kind, resource_id, weekday_id)
+            for kind, resource_id in resources if resource_id is not None
+            for weekday_id in group['days']
+        ]
+        for key in keys:
+            self.intervals[key][group['id']] = interval
+        self.group_keys[group['id']] = keys
+        self.groups[group['id']] = group
+        if members:
+            self.members[group['id']] = members
+        return keys
+
+    def _remove(self, group_id):
+        keys = self.group_keys.pop(group_id, [])
+        for key in keys:
+            self.intervals[key].pop(group_id, None)
+        self.groups.pop(group_id, None)
+        self.members.pop(group_id, None)
+        return keys
+
+    def _index(self, keys):
+        for key in keys:
+            if self.intervals.get(key):
+                self.buckets[key] = IntervalIndex(self.intervals[key].values())
+            else:
+                self.buckets.pop(key, None)
+                self.intervals.pop(key, None)
+
+    def _build(self, today):
+        self.buckets, self.intervals = {}, defaultdict(dict)
+        self.group_keys, self.groups, self.members = {}, {}, {}
+        groups, members = self._load(today)
+        for group in groups.values():
+            self._add(group, members[group['id']])
+        self._index(list(self.intervals))
+
+    def _reload(self, group_ids, today):
+        touched = set()
+        for group_id in group_ids:
+            touched.update(self._remove(group_id))
+        groups, members = self._load(today, pk__in=group_ids)
+        for group in groups.values():
+            touched.update(self._add(group, members[group['id']]))
+        self._index(touched)
+
+    def conflicts(self, resources, weekday_ids, start_time, end_time, start_date, end_date, exclude_group_id=None):
+        """
+        Returns (kind, resource_id, group) for every active group that books
+        one of `resources` ((kind, id) pairs) in an overlapping slot.
+        """
+        self.sync()
+        start, end = to_minutes(start_time), to_minutes(end_time)
+
+        found = []
+        with self._lock:
+            for kind, resource_id in resources:
+                seen = set()
+                for weekday_id in weekday_ids:
+                    bucket = self.buckets.get((kind, resource_id, weekday_id))
+                    if bucket is None:
+                        continue
+                    for group_id in bucket.overlapping(start, end, start_date, end_date):
+                        if group_id != exclude_group_id and group_id not in seen:
+                            seen.add(group_id)
+                            found.append((kind, resource_id, self.groups[group_id]))
+
+        return found
+
+    def group_members(self, group_id):
+        self.sync()
+        return self.members.get(group_id, [])
+
+
+schedule_index = ShardLocal(ScheduleIndex)
+
+
+def describe_conflicts(conflicts):
+    return [
+        f"{kind.capitalize()} {resource_id} is already booked by group '{group['name']}' "
+        f"({group['start_time']:%H:%M}-{group['end_time']:%H:%M})."
+        for kind, resource_id, group in conflicts
+    ]
+
+
+BUCKET_MINUTES = 5
+DAY_BUCKETS = 24 * 60 // BUCKET_MINUTES
+
+
+def slot_mask(weekday_numbers, start_time, end_time):
+    """Bits of the weekly bitmap (one bit per 5 minutes) covered by a slot."""
+    first = to_minutes(start_time) // BUCKET_MINUTES
+    last = -(-to_minutes(end_time) // BUCKET_MINUTES)
+    run = (1 << max(last - first, 0)) - 1
+
+    mask = 0
+    for number in weekday_numbers:
+        mask |= run << (number * DAY_BUCKETS + first)
+    return mask
+
+
+class SlotBitmaps(GroupIndex):
+    """
+    Weekly occupancy bitmaps of every room and teacher, one per group so
+    date ranges can be respected. Busy time over a date range is the OR of
+    the masks of the groups running in it, and free time for several
+    resources is a few bitwise operations. Changed groups are applied in
+    place, see GroupIndex.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.resources = defaultdict(dict)
+        self.groups = {}
+
+    def _rows(self, **filters):
+        groups = {
+            group['id']: group for group in
+            Group.objects.filter(**filters).values(
+                'id', 'room_id', 'teacher_id', 'start_date', 'end_date', 'start_time', 'end_time'
+            )
+        }
+        days = defaultdict(list)
+        through = Group.days.through.objects.filter(group_id__in=groups, weekday__number__isnull=False)
+        for group_id, number in through.values_list('group_id', 'weekday__number'):
+            days[group_id].append(number)
+
+        for group in groups.values():
+            yield group, days[group['id']]
+
+    def _add(self, group, weekday_numbers):
+        mask = slot_mask(weekday_numbers, group['start_time'], group['end_time'])
+        keys = [key for key in (('room', group['room_id']), ('teacher', group['teacher_id'])) if key[1] is not None]
+        for key in keys:
+            self.resources[key][group['id']] = (mask, group['start_date'], group['end_date'])
+        self.groups[group['id']] = keys
+
+    def _remove(self, group_id):
+        for key in self.groups.pop(group_id, []):
+            self.resources[key].pop(group_id, None)
+            if not self.resources[key]:
+                del self.resources[key]
+
+    def _build(self, today):
+        self.resources = defaultdict(dict)
+        self.groups = {}
+        for group, weekday_numbers in self._rows(end_date__gte=today):
+            self._add(group, weekday_numbers)
+
+    def _reload(self, group_ids, today):
+        for group_id in group_ids:
+            self._remove(group_id)
+        for group, weekday_numbers in self._rows(pk__in=group_ids, end_date__gte=today):
+            self._add(group, weekday_numbers)
+
+    def busy(self, resources, date_from, date_to):
+        self.sync()
+        mask = 0
+        with self._lock:
+            for key in resources:
+                for group_mask, start_date, end_date in self.resources.get(key, {}).values():
+                    if start_date <= date_to and date_from <= end_date:
+                        mask |= group_mask
+        return mask
+
+
+slot_bitmaps = ShardLocal(SlotBitmaps)
+
+
+def free_slots(busy_mask, weekday_numbers, day_start, day_end, duration):
+    """
+    Decodes the free runs of at least `duration` minutes between `day_start`
+    and `day_end` for each weekday number. Returns {number: [(start, end)]}
+    with times in minutes.
+    """
+    first = to_minutes(day_start) // BUCKET_MINUTES
+    last = to_minutes(day_end) // BUCKET_MINUTES
+    min_buckets = -(-duration // BUCKET_MINUTES)
+
+    slots = {}
+    for number in weekday_numbers:
+        day = busy_mask >> (number * DAY_BUCKETS)
+        runs, run_start = [], None
+        for bucket in range(first, last + 1):
+            is_free = bucket < last and not (day >> bucket) & 1
+            if is_free and run_start is None:
+                run_start = bucket
+            elif not is_free and run_start is not None:
+                if bucket - run_start >= min_buckets:
+                    runs.append((run_start * BUCKET_MINUTES, bucket * BUCKET_MINUTES))
+                run_start = None
+        slots[number] = runs
+
+    return slots
@@ -1,6 +1,15 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils import timezone
+from django.utils.text import get_valid_filename
 from rest_framework import serializers
 
 from account.models import CustomUser, Student, AdminTeacher, CourseType, Course
+from config.relations import BatchPrimaryKeyRelatedField, BatchRelatedListSerializer
+from .schedule import schedule_index, describe_conflicts
 from .models import (
     Weekday,
     Room,
@@ -13,10 +22,10 @@ from .models import (
 
 
 class AttendenceSerailizer(serializers.ModelSerializer):
-    student = serializers.PrimaryKeyRelatedField(
+    student = BatchPrimaryKeyRelatedField(
         queryset=Student.objects.all()
     )
-    lesson = serializers.PrimaryKeyRelatedField(
+    lesson = BatchPrimaryKeyRelatedField(
         queryset=Lesson.objects.all()
     )
 
@@ -24,16 +33,64 @@ class AttendenceSerailizer(serializers.ModelSerializer):
         model = Attendence
         fields = '__all__'
         read_only_fields = ['id', 'time']
+        list_serializer_class = BatchRelatedListSerializer
+
+
+class RollCallSerializer(serializers.Serializer):
+    lesson = BatchPrimaryKeyRelatedField(
+        queryset=Lesson.objects.all()
+    )
+    statuses = serializers.DictField(
+        child=serializers.ChoiceField(choices=Attendence.ATTENDENCE_STATUS),
+        allow_empty=False
+    )
+
+    def validate_statuses(self, statuses:dict):
+        try:
+            return {int(student_id): status for student_id, status in statuses.items()}
+        except ValueError:
+            raise serializers.ValidationError("Student ids must be integers!")
+
+    def validate(self, attrs):
+        lesson = attrs['lesson']
+        student_ids = set(attrs['statuses'])
+
+        active = set(
+            StudentGroup.objects
+            .filter(group_id=lesson.group_id, status='active', student_id__in=student_ids)
+            .values_list('student_id', flat=True)
+        )
+        outsiders = sorted(student_ids - active)
+        if outsiders:
+            raise serializers.ValidationError(
+                {'statuses': f"Students {outsiders} are not active members of this lesson's group!"}
+            )
+
+        return attrs
+
+    def create(self, validated_data):
+        lesson = validated_data['lesson']
+        rows = [
+            Attendence(student_id=student_id, lesson=lesson, status=status)
+            for student_id, status in validated_data['statuses'].items()
+        ]
+
+        return Attendence.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['student', 'lesson'],
+            update_fields=['status'],
+        )
 
 
 class HomeworkSerializer(serializers.ModelSerializer):
-    lesson = serializers.PrimaryKeyRelatedField(
+    lesson = BatchPrimaryKeyRelatedField(
         queryset=Lesson.objects.all()
     )
-    student = serializers.PrimaryKeyRelatedField(
+    student = BatchPrimaryKeyRelatedField(
         queryset=Student.objects.all()
     )
-    group = serializers.PrimaryKeyRelatedField(
+    group = BatchPrimaryKeyRelatedField(
         queryset=Group.objects.all()
     )
 
@@ -41,24 +98,89 @@ class HomeworkSerializer(serializers.ModelSerializer):
         model = Homework
         fields = '__all__'
         read_only_fields = ['id', 'time', 'xp', 'coins', 'status']
+        list_serializer_class = BatchRelatedListSerializer
+
+
+class HomeworkGradeListSerializer(BatchRelatedListSerializer):
+
+    def validate(self, attrs):
+        counts = Counter(grade['homework'] for grade in attrs)
+        repeated = sorted(homework_id for homework_id, count in counts.items() if count > 1)
+        if repeated:
+            raise serializers.ValidationError(f"Homeworks {repeated} are graded more than once!")
+        return attrs
+
+
+class HomeworkGradeSerializer(serializers.Serializer):
+    homework = BatchPrimaryKeyRelatedField(
+        queryset=Homework.objects.all()
+    )
+    status = serializers.ChoiceField(choices=['done', 'refused'])
+    ball = serializers.IntegerField(min_value=0, max_value=100)
+    xp = serializers.IntegerField(min_value=0, default=0)
+    coins = serializers.IntegerField(min_value=0, default=0)
+
+    class Meta:
+        list_serializer_class = HomeworkGradeListSerializer
+
+    def to_internal_value(self, data):
+        attrs = super().to_internal_value(data)
+        attrs['homework'] = attrs['homework'].id
+        return attrs
 
 
 class LessonSerializer(serializers.ModelSerializer):
-    group = serializers.PrimaryKeyRelatedField(
+    group = BatchPrimaryKeyRelatedField(
         queryset=Group.objects.all()
     )
 
     class Meta:
         model = Lesson
         fields = '__all__'
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'is_published']
+        list_serializer_class = BatchRelatedListSerializer
         
         
+class LessonGenerateSerializer(serializers.Serializer):
+    groups = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+
+    def validate_groups(self, groups:list):
+        found = set(Group.objects.filter(pk__in=groups).values_list('id', flat=True))
+        missing = sorted(set(groups) - found)
+        if missing:
+            raise serializers.ValidationError(f"Groups {missing} do not exist!")
+
+        return groups
+
+
+class VideoUploadSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=200)
+    size = serializers.IntegerField(min_value=1, max_value=settings.VIDEO_UPLOAD_MAX_SIZE)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+    chunk_size = serializers.IntegerField(
+        min_value=64 * 1024,
+        max_value=settings.VIDEO_UPLOAD_MAX_CHUNK_SIZE,
+        default=settings.VIDEO_UPLOAD_CHUNK_SIZE,
+    )
+
+    def validate_filename(self, filename):
+        try:
+            return get_valid_filename(filename.replace('\\', '/').rsplit('/', 1)[-1])
+        except SuspiciousFileOperation:
+            raise serializers.ValidationError("Invalid file name!")
+
+    def validate_sha256(self, sha256):
+        return sha256.lower()
+
+
 class StudentGroupSerializer(serializers.ModelSerializer):
-    student = serializers.PrimaryKeyRelatedField(
+    student = BatchPrimaryKeyRelatedField(
         queryset=Student.objects.all()
     )
-    group = serializers.PrimaryKeyRelatedField(
+    group = BatchPrimaryKeyRelatedField(
         queryset=Group.objects.all()
     )
 
@@ -66,23 +188,94 @@ class StudentGroupSerializer(serializers.ModelSerializer):
         model = StudentGroup
         fields = '__all__'
         read_only_fields = ['id', 'joined_at', 'left_at', 'status']
+        list_serializer_class = BatchRelatedListSerializer
+
+    def validate(self, attrs):
+        group = attrs['group']
+        conflicts = schedule_index.conflicts(
+            [('student', attrs['student'].id)],
+            group.days.values_list('id', flat=True),
+            group.start_time, group.end_time,
+            group.start_date, group.end_date,
+            exclude_group_id=group.id,
+        )
+        if conflicts:
+            raise serializers.ValidationError({'group': describe_conflicts(conflicts)})
+
+        return attrs
 
 
 class GroupSerializer(serializers.ModelSerializer):
-    teacher = serializers.PrimaryKeyRelatedField(
+    teacher = BatchPrimaryKeyRelatedField(
         queryset=AdminTeacher.objects.all()
     )
-    room = serializers.PrimaryKeyRelatedField(
+    room = BatchPrimaryKeyRelatedField(
         queryset=Room.objects.all()
     )
-    course = serializers.PrimaryKeyRelatedField(
+    course = BatchPrimaryKeyRelatedField(
         queryset=Course.objects.all()
     )
+    days = BatchPrimaryKeyRelatedField(
+        queryset=Weekday.objects.all(),
+        many=True,
+        allow_empty=False
+    )
 
     class Meta:
         model = Group
         fields = '__all__'
-        read_only_fields = ['id', 'start_date', 'end_date', 'start_time', 'end_time', 'days']
+        read_only_fields = ['id', 'branch']
+        list_serializer_class = BatchRelatedListSerializer
+
+    def validate(self, attrs):
+        def current(name):
+            return attrs[name] if name in attrs else getattr(self.instance, name, None)
+
+        if current('start_time') >= current('end_time'):
+            raise serializers.ValidationError({'end_time': "The group must end after it starts!"})
+        if current('start_date') > current('end_date'):
+            raise serializers.ValidationError({'end_date': "The end date cannot be before the start date!"})
+
+        if 'days' in attrs:
+            weekday_ids = [day.id for day in attrs['days']]
+        else:
+            weekday_ids = list(self.instance.days.values_list('id', flat=True)) if self.instance else []
+
+        group_id = self.instance.id if self.instance else None
+        resources = [('room', getattr(current('room'), 'id', None)), ('teacher', getattr(current('teacher'), 'id', None))]
+        if group_id:
+            resources += [('student', student_id) for student_id in schedule_index.group_members(group_id)]
+
+        conflicts = schedule_index.conflicts(
+            [resource for resource in resources if resource[1] is not None],
+            weekday_ids,
+            current('start_time'), current('end_time'),
+            current('start_date'), current('end_date'),
+            exclude_group_id=group_id,
+        )
+        if conflicts:
+            raise serializers.ValidationError({'non_field_errors': describe_conflicts(conflicts)})
+
+        return attrs
+
+
+class FreeSlotQuerySerializer(serializers.Serializer):
+    room = serializers.IntegerField(min_value=1, required=False)
+    teacher = serializers.IntegerField(min_value=1, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    duration = serializers.IntegerField(min_value=5, max_value=24 * 60, default=60)
+
+    def validate(self, attrs):
+        if not attrs.get('room') and not attrs.get('teacher'):
+            raise serializers.ValidationError("Either room or teacher must be given!")
+
+        attrs.setdefault('date_from', timezone.localdate())
+        attrs.setdefault('date_to', attrs['date_from'] + timedelta(days=6))
+        if attrs['date_to'] < attrs['date_from']:
+            raise serializers.ValidationError({'date_to': "The end date cannot be before the start date!"})
+
+        return attrs
 
 
 class RoomSerializer(serializers.ModelSerializer):
@@ -96,4 +289,4 @@ class WeekDaySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Weekday
-        fields = ['name']
\ No newline at end of file
+        fields = ['name', 'number']
\ No newline at end of file
@@ -0,0 +1,175 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+from account.models import Student
+from . import timetable
+from .leaderboard import leaderboard
+from .models import Homework, Lesson, StudentGroup, Weekday
+
+
+GRADED_STATUSES = ('done', 'refused')
+
+
+def grade_homeworks(grades):
+    """
+    Grades homeworks and credits the students in one transaction.
+
+    `grades` is a list of dicts with `homework` (id), `status` ('done' or
+    'refused'), `ball`, `xp` and `coins`, one per homework. Refused
+    homeworks earn nothing. Regrading only applies the difference to what was
+    credited before. Student totals are updated with F() expressions, one
+    UPDATE per distinct (xp, coins) delta, so concurrent grading never loses
+    an increment, and never go below zero when an admin lowered them since.
+    """
+    by_homework = {grade['homework']: grade for grade in grades}
+    if len(by_homework) != len(grades):
+        raise ValueError("Each homework can only be graded once per call.")
+    grades = by_homework
+
+    using = router.db_for_write(Homework)
+    with transaction.atomic(using=using):
+        homeworks = Homework.objects.select_for_update().in_bulk(list(grades))
+        deltas = defaultdict(lambda: [0, 0])
+
+        for homework_id, grade in grades.items():
+            homework = homeworks[homework_id]
+            credited = (homework.xp, homework.coins) if homework.status == 'done' else (0, 0)
+
+            homework.status = grade['status']
+            homework.ball = grade['ball']
+            if homework.status == 'done':
+                homework.xp, homework.coins = grade.get('xp', 0), grade.get('coins', 0)
+            else:
+                homework.xp, homework.coins = 0, 0
+
+            delta = deltas[homework.student_id]
+            delta[0] += homework.xp - credited[0]
+            delta[1] += homework.coins - credited[1]
+
+        Homework.objects.bulk_update(homeworks.values(), ['status', 'ball', 'xp', 'coins'])
+
+        students_by_delta = defaultdict(list)
+        for student_id, (xp, coins) in deltas.items():
+            if xp or coins:
+                students_by_delta[(xp, coins)].append(student_id)
+
+        for (xp, coins), student_ids in students_by_delta.items():
+            Student.objects.filter(pk__in=student_ids).update(
+                xp=Greatest(F('xp') + xp, 0),
+                coins=Greatest(F('coins') + coins, 0),
+            )
+
+        changed = [student_id for student_ids in students_by_delta.values() for student_id in student_ids]
+        if changed:
+            transaction.on_commit(lambda: leaderboard.students_changed(changed), using=using)
+
+    return list(homeworks.values())
+
+
+def term_dates(group, weekday_numbers):
+    day = group.start_date
+    while day <= group.end_date:
+        if day.weekday() in weekday_numbers:
+            yield day
+        day += timedelta(days=1)
+
+
+# A generated lesson nobody has edited, published or used yet
+UNTOUCHED_LESSON = {
+    'task_text': '',
+    'task_file': '',
+    'is_published': False,
+    'homeworks__isnull': True,
+    'attendences__isnull': True,
+    'video_uploads__isnull': True,
+}
+
+
+def generate_lessons(groups, batch_size=1000):
+    """
+    Expands the terms of `groups` into one Lesson per scheduled date.
+
+    Safe to re-run after schedule edits: only missing dates are inserted,
+    and lessons whose date is no longer scheduled are removed only while
+    they are untouched (see UNTOUCHED_LESSON). Edited ones are left for an
+    admin to deal with. Returns the number of (created, removed) lessons.
+    """
+    groups = list(groups.prefetch_related('days'))
+    group_ids = [group.id for group in groups]
+    weekdays = {weekday.number: weekday.id for weekday in Weekday.objects.filter(number__isnull=False)}
+
+    existing = defaultdict(dict)
+    for lesson_id, group_id, date in Lesson.objects.filter(group_id__in=group_ids, date__isnull=False).values_list('id', 'group_id', 'date'):
+        existing[group_id][date] = lesson_id
+
+    stale = []
+    def missing_lessons():
+        for group in groups:
+            numbers = {weekday.number for weekday in group.days.all() if weekday.number is not None}
+            scheduled = set(term_dates(group, numbers))
+            stale.extend(lesson_id for date, lesson_id in existing[group.id].items() if date not in scheduled)
+
+            for date in sorted(scheduled - existing[group.id].keys()):
+                yield Lesson(
+                    name=f'{group.name} - {date:%d.%m.%Y}',
+                    group_id=group.id,
+                    date=date,
+                    day_id=weekdays[date.weekday()],
+                    task_text='',
+                )
+
+    created = 0
+    rows = missing_lessons()
+    using = router.db_for_write(Lesson)
+    with transaction.atomic(using=using):
+        while batch := list(islice(rows, batch_size)):
+            Lesson.objects.bulk_create(batch)
+            created += len(batch)
+
+        # Through the collector, so the post_delete receivers see every removed
+        # lesson; nothing refers to untouched ones, so it cascades nowhere
+        _, deleted = (
+            Lesson.objects
+            .filter(Q(video='') | Q(video__isnull=True), pk__in=stale, **UNTOUCHED_LESSON)
+            .delete()
+        )
+        removed = deleted.get(Lesson._meta.label, 0)
+
+        transaction.on_commit(lambda: timetable.invalidate(timetable.group_resources(group_ids)), using=using)
+
+    return created, removed
+
+
+def publish_lesson(lesson):
+    """
+    Publishes a lesson and gives every active student of its group a
+    'not_given' homework placeholder. Students who already have one are
+    skipped, so publishing twice is harmless. Returns the number created.
+    """
+    with transaction.atomic(using=router.db_for_write(Homework, instance=lesson)):
+        student_ids = (
+            StudentGroup.objects
+            .filter(group_id=lesson.group_id, status='active')
+            .exclude(student_id__in=Homework.objects.filter(lesson_id=lesson.id).values('student_id'))
+            .values_list('student_id', flat=True)
+        )
+        homeworks = Homework.objects.bulk_create([
+            Homework(
+                lesson_id=lesson.id,
+                student_id=student_id,
+                group_id=lesson.group_id,
+                text=lesson.task_text,
+                status='not_given',
+            )
+            for student_id in student_ids
+        ])
+
+        Lesson.objects.filter(pk=lesson.id).update(is_published=True)
+        lesson.is_published = True
+
+    return len(homeworks)
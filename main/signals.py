@@ -0,0 +1,132 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from account.models import Student
+from . import timetable
+from .caching import bump_version
+from .leaderboard import leaderboard
+from .models import Group, Homework, Lesson, StudentGroup
+from .schedule import log_group_changes
+from .storage import blob_storage
+
+
+# Versions are bumped on commit: bumping earlier lets another process rebuild
+# from data that is not committed yet and then never rebuild again. Schedule
+# changes are logged in the writing transaction instead, so they become
+# visible together with it.
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, using=None, **kwargs):
+    transaction.on_commit(lambda: leaderboard.students_changed([instance.id]), using=using)
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=StudentGroup)
+@receiver(post_delete, sender=StudentGroup)
+def membership_changed(sender, instance, using=None, **kwargs):
+    student_id = instance.id if sender is Student else instance.student_id
+    # Deleting a student deletes its memberships too, one by one
+    if sender is StudentGroup:
+        log_group_changes([instance.group_id], using)
+
+    def publish():
+        bump_version('leaderboard')
+        timetable.invalidate([('student', student_id)])
+
+    transaction.on_commit(publish, using=using)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_resources(sender, instance, **kwargs):
+    instance._resources_before = (
+        Group.objects.filter(pk=instance.pk).values_list('room_id', 'teacher_id').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(m2m_changed, sender=Group.days.through)
+def group_schedule_changed(sender, instance, action='post_save', reverse=False, pk_set=None, using=None, **kwargs):
+    if reverse and action == 'pre_clear':
+        # A weekday losing all its groups doesn't say which ones they were
+        instance._cleared_group_ids = list(instance.group_set.values_list('id', flat=True))
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        group_ids = list(pk_set) if pk_set is not None else getattr(instance, '_cleared_group_ids', [])
+    else:
+        group_ids = [instance.pk]
+    log_group_changes(group_ids, using)
+
+    rooms, teachers = [], []
+    if not reverse:
+        before = getattr(instance, '_resources_before', None) or (None, None)
+        rooms, teachers = [instance.room_id, before[0]], [instance.teacher_id, before[1]]
+
+    transaction.on_commit(lambda: timetable.invalidate(timetable.group_resources(group_ids, rooms, teachers)), using=using)
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_group(sender, instance, **kwargs):
+    instance._group_before, instance._file_before = (
+        Lesson.objects.filter(pk=instance.pk).values_list('group_id', 'task_file').first()
+        if instance.pk else None
+    ) or (None, None)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_changed(sender, instance, using=None, **kwargs):
+    group_ids = {instance.group_id, getattr(instance, '_group_before', None)} - {None}
+    transaction.on_commit(lambda: timetable.invalidate(timetable.group_resources(group_ids)), using=using)
+
+
+# Files are stored by content and shared, see main.storage. A blob gains a
+# reference when a row is given its name (uploads count themselves) and
+# loses one once the row that used it is deleted or points elsewhere.
+
+FILE_FIELDS = {Lesson: 'task_file', Homework: 'file'}
+
+
+def saves_file(sender, update_fields):
+    return update_fields is None or FILE_FIELDS[sender] in update_fields
+
+
+@receiver(pre_save, sender=Homework)
+def remember_homework_file(sender, instance, update_fields=None, **kwargs):
+    instance._file_before = None
+    if instance.pk and saves_file(sender, update_fields):
+        instance._file_before = Homework.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Homework)
+def file_replaced(sender, instance, update_fields=None, using=None, **kwargs):
+    if not saves_file(sender, update_fields):
+        return
+    before = getattr(instance, '_file_before', None) or None
+    name = getattr(instance, FILE_FIELDS[sender]).name or None
+    # Uploads count their own reference when they are stored
+    counted = name in instance.__dict__.pop('_counted_blobs', ())
+
+    if name == before:
+        if name and counted:
+            # The same content again, the row already held a reference
+            transaction.on_commit(lambda: blob_storage.delete(name), using=using)
+        return
+
+    if name and not counted:
+        blob_storage.reference(name)
+    if before:
+        transaction.on_commit(lambda: blob_storage.delete(before), using=using)
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Homework)
+def file_owner_deleted(sender, instance, using=None, **kwargs):
+    name = getattr(instance, FILE_FIELDS[sender]).name
+    if name:
+        transaction.on_commit(lambda: blob_storage.delete(name), using=using)
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import tempfile
+from pathlib import PurePath
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+
+
+BLOB_PREFIX = 'blobs/'
+READ_SIZE = 1024 * 1024
+
+
+def blob_name(content_hash, ext):
+    return f'{BLOB_PREFIX}{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{ext.lower()}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its content, so identical uploads
+    share one blob. Request uploads arrive hashed by the handlers below,
+    other content is hashed while it is written to disk, never in a second
+    pass. main.Blob counts the references, and delete() only removes the
+    file when the last one goes. Names outside BLOB_PREFIX are left alone.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The real name depends on the content, see _save
+        return name
+
+    def _save(self, name, content):
+        ext = PurePath(name).suffix[:16]
+        content_hash = getattr(content, 'sha256', None)
+        digest = None if content_hash else hashlib.sha256()
+
+        if hasattr(content, 'temporary_file_path'):
+            source = content.temporary_file_path()
+            if digest:
+                with open(source, 'rb') as file:
+                    while data := file.read(READ_SIZE):
+                        digest.update(data)
+            size = os.path.getsize(source)
+        else:
+            os.makedirs(self.path(BLOB_PREFIX), exist_ok=True)
+            fd, source = tempfile.mkstemp(dir=self.path(BLOB_PREFIX), suffix='.part')
+            size = 0
+            with os.fdopen(fd, 'wb') as file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if digest:
+                        digest.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+
+        content_hash = content_hash or digest.hexdigest()
+        final, is_new = self._add_reference(content_hash, blob_name(content_hash, ext), size)
+        if is_new:
+            path = self.path(final)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_move_safe(source, path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        elif not hasattr(content, 'temporary_file_path'):
+            os.remove(source)
+        return final
+
+    def _add_reference(self, content_hash, name, size):
+        """
+        Counts one more reference to the blob of `content_hash`. Returns its
+        name (the first upload's extension wins) and whether its file still
+        has to be written.
+        """
+        Blob = apps.get_model('main', 'Blob')
+        try:
+            with transaction.atomic(using=router.db_for_write(Blob)):
+                if not Blob.objects.filter(pk=content_hash).update(refs=F('refs') + 1):
+                    Blob.objects.create(hash=content_hash, name=name, size=size, refs=1)
+                    return name, True
+        except IntegrityError:
+            # Another upload of the same content got there first
+            Blob.objects.filter(pk=content_hash).update(refs=F('refs') + 1)
+
+        name = Blob.objects.values_list('name', flat=True).get(pk=content_hash)
+        return name, not self.exists(name)
+
+    def reference(self, name):
+        """Counts one more reference to a stored blob given to a row by name."""
+        if name and name.startswith(BLOB_PREFIX):
+            Blob = apps.get_model('main', 'Blob')
+            Blob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+    def delete(self, name):
+        if not name or not name.startswith(BLOB_PREFIX):
+            return
+
+        Blob = apps.get_model('main', 'Blob')
+        with transaction.atomic(using=router.db_for_write(Blob)):
+            Blob.objects.filter(name=name, refs__gt=0).update(refs=F('refs') - 1)
+            unused = Blob.objects.select_for_update().filter(name=name, refs=0).delete()[0]
+        if unused:
+            super().delete(name)
+
+
+blob_storage = ContentAddressedStorage()
+
+
+class HashingUploadMixin:
+    """
+    Hashes request uploads chunk by chunk as Django receives them and puts
+    the digest on the uploaded file as `sha256`, for ContentAddressedStorage.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Before super(), MemoryFileUploadHandler raises StopFutureHandlers
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # MemoryFileUploadHandler passes files too big for it on to the next handler
+        if getattr(self, 'activated', True):
+            self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def get_blob_storage():
+    return blob_storage
+
+
+class BlobFieldFile(FieldFile):
+    """Tells its row which stored names counted their reference already, see main.signals."""
+
+    def save(self, name, content, save=True):
+        super().save(name, content, save=False)
+        self.instance.__dict__.setdefault('_counted_blobs', set()).add(self.name)
+        if save:
+            self.instance.save()
+
+
+class BlobFileField(models.FileField):
+    attr_class = BlobFieldFile
+
+    def __init__(self, *args, storage=get_blob_storage, **kwargs):
+        super().__init__(*args, storage=storage, **kwargs)
@@ -1,3 +1,959 @@
-from django.test import TestCase
+import hashlib
+import os
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from account.models import CustomUser, CourseType, Course, AdminTeacher, Student
+from account.serializers import RoleTokenObtainPairSerializer
+from config.db_routers import BranchRouter, ReplicaRouter, is_pinned, use_branch, use_replica
+from config.middleware import PIN_COOKIE, ReplicaMiddleware
+from .leaderboard import leaderboard
+from .models import Weekday, Room, Group, StudentGroup, Lesson, Homework, Attendence, Blob, VideoUpload
+from .schedule import ScheduleIndex, SlotBitmaps, slot_mask
+from .services import generate_lessons, grade_homeworks, publish_lesson
+from .storage import blob_storage
+from .uploads import part_path
+
+
+def create_group(name='Group 1', **fields):
+    fields = {'start_date': date(2026, 1, 1), 'end_date': date(2026, 6, 1), 'start_time': time(9), 'end_time': time(10), **fields}
+    return Group.objects.create(name=name, **fields)
+
+
+def create_student(phone, group=None):
+    user = CustomUser.objects.create_user(phone=phone, email=f'{phone}@gmail.com', password='x')
+    student = Student.objects.create(user=user, gender='M', year=2010)
+    if group:
+        StudentGroup.objects.create(student=student, group=group)
+    return student
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}")
+    return client
+
+
+def staff_client(phone='+998900000001'):
+    user = CustomUser.objects.create_user(phone=phone, email=f'{phone}@gmail.com', password='x')
+    AdminTeacher.objects.create(user=user, role='admin')
+    return client_for(user)
+
+
+class RollCallTests(TestCase):
+
+    def setUp(self):
+        group = create_group()
+        self.lesson = Lesson.objects.create(name='Lesson 1', group=group, task_text='-', task_file='task.pdf')
+        self.first = create_student('+998901111111', group)
+        self.second = create_student('+998902222222', group)
+        self.client = staff_client()
+
+    def roll_call(self, statuses):
+        return self.client.post(
+            '/attendences/roll_call/', {'lesson': self.lesson.id, 'statuses': statuses}, format='json'
+        )
+
+    def statuses(self):
+        return dict(Attendence.objects.filter(lesson=self.lesson).values_list('student_id', 'status'))
+
+    def test_marks_and_corrects_a_whole_lesson(self):
+        response = self.roll_call({self.first.id: 'came', self.second.id: 'absent'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+        self.assertEqual(self.roll_call({self.first.id: 'late'}).status_code, 200)
+        self.assertEqual(self.statuses(), {self.first.id: 'late', self.second.id: 'absent'})
+
+    def test_students_outside_the_group_are_refused(self):
+        outsider = create_student('+998903333333')
+        response = self.roll_call({self.first.id: 'came', outsider.id: 'came'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(outsider.id), str(response.data['statuses']))
+        self.assertEqual(self.statuses(), {})
+
+
+
+class GradingTests(TestCase):
+
+    def setUp(self):
+        group = create_group()
+        lesson = Lesson.objects.create(name='Lesson 1', group=group, task_text='-', task_file='task.pdf')
+        self.student = create_student('+998901111111', group)
+        self.homeworks = Homework.objects.bulk_create(
+            Homework(lesson=lesson, student=self.student, group=group, text=str(n), status='waiting') for n in range(2)
+        )
+        self.client = staff_client()
+
+    def grade(self, *grades):
+        return self.client.post('/homeworks/grade/', [
+            {'homework': homework.id, 'status': status, 'ball': 80, 'xp': xp, 'coins': xp // 2}
+            for homework, status, xp in grades
+        ], format='json')
+
+    def totals(self):
+        self.student.refresh_from_db()
+        return self.student.xp, self.student.coins
+
+    def test_regrading_credits_only_the_difference(self):
+        first, second = self.homeworks
+        self.assertEqual(self.grade((first, 'done', 10), (second, 'done', 6)).status_code, 200)
+        self.assertEqual(self.totals(), (16, 8))
+
+        self.grade((first, 'done', 4))
+        self.assertEqual(self.totals(), (10, 5))
+        self.grade((first, 'refused', 10))
+        self.assertEqual(self.totals(), (6, 3))
+        self.grade((first, 'done', 8))
+        self.assertEqual(self.totals(), (14, 7))
+
+    def test_totals_lowered_by_an_admin_do_not_go_negative(self):
+        first, _ = self.homeworks
+        self.grade((first, 'done', 10))
+        Student.objects.filter(pk=self.student.pk).update(xp=3, coins=1)
+
+        self.assertEqual(self.grade((first, 'refused', 0)).status_code, 200)
+        self.assertEqual(self.totals(), (0, 0))
+
+    def test_a_homework_graded_twice_in_one_request_is_refused(self):
+        first, _ = self.homeworks
+        response = self.grade((first, 'done', 10), (first, 'done', 20))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.totals(), (0, 0))
+
+
+
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        leaderboard.clear()
+        self.addCleanup(leaderboard.clear)
+        self.group = create_group()
+        self.students = [create_student(f'+99890111111{n}', self.group if n < 2 else None) for n in range(3)]
+        for student, xp in zip(self.students, (30, 10, 20)):
+            Student.objects.filter(pk=student.pk).update(xp=xp)
+        self.client = client_for(self.students[1].user)
+
+    def ranking(self, **params):
+        response = self.client.get('/leaderboard/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['rank'], row['student'], row['xp']) for row in response.data['results']]
+
+    def test_ranks_by_xp_per_scope_and_follows_changes_in_place(self):
+        first, second, third = (student.id for student in self.students)
+        self.assertEqual(self.ranking(), [(1, first, 30), (2, third, 20), (3, second, 10)])
+        self.assertEqual(self.ranking(scope='group', id=self.group.id), [(1, first, 30), (2, second, 10)])
+
+        student = self.students[1]
+        student.xp = 25
+        with self.captureOnCommitCallbacks(execute=True):
+            student.save()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(leaderboard.board().rank(second), 2)
+        response = self.client.get('/leaderboard/me/', {'scope': 'group', 'id': self.group.id})
+        self.assertEqual((response.data['rank'], response.data['xp']), (2, 25))
+
+
+class ScheduleIndexTests(TestCase):
+
+    def setUp(self):
+        today = timezone.localdate()
+        self.term = (today, today + timedelta(days=90))
+        self.monday = Weekday.objects.create(name='Monday', number=0)
+        self.room = Room.objects.create(name='Room 1')
+        self.group = create_group(room=self.room, start_date=self.term[0], end_date=self.term[1])
+        self.group.days.add(self.monday)
+        # Two indexes stand for two processes
+        self.indexes = ScheduleIndex(), ScheduleIndex()
+
+    def conflicts(self, index):
+        return [
+            group['id'] for _, _, group in
+            index.conflicts([('room', self.room.id)], [self.monday.id], time(9, 30), time(10, 30), *self.term)
+        ]
+
+    def test_follows_changes_made_by_any_process_one_group_at_a_time(self):
+        for index in self.indexes:
+            self.assertEqual(self.conflicts(index), [self.group.id])
+
+        self.group.start_time, self.group.end_time = time(11), time(12)
+        self.group.save()
+        other = create_group('Group 2', start_date=self.term[0], end_date=self.term[1])
+
+        for index in self.indexes:
+            # The changes, then the two changed groups with their days and members
+            with self.assertNumQueries(4):
+                self.assertEqual(self.conflicts(index), [])
+            with self.assertNumQueries(1):
+                self.conflicts(index)
+            self.assertEqual(set(index.groups), {self.group.id, other.id})
+
+    def test_deleted_groups_leave_the_index(self):
+        index = self.indexes[0]
+        self.conflicts(index)
+        self.group.delete()
+
+        self.assertEqual(self.conflicts(index), [])
+        self.assertEqual(index.groups, {})
+        self.assertEqual(index.buckets, {})
+
+
+class SlotBitmapsTests(TestCase):
+
+    def setUp(self):
+        today = timezone.localdate()
+        self.term = (today, today + timedelta(days=90))
+        self.room = Room.objects.create(name='Room 1')
+        self.group = create_group(room=self.room, start_date=self.term[0], end_date=self.term[1])
+        self.group.days.add(Weekday.objects.create(name='Monday', number=0))
+        self.bitmaps = SlotBitmaps()
+
+    def busy(self):
+        return self.bitmaps.busy([('room', self.room.id)], *self.term)
+
+    def test_applies_edits_to_the_changed_group_only(self):
+        self.assertEqual(self.busy(), slot_mask([0], time(9), time(10)))
+
+        self.group.start_time, self.group.end_time = time(11), time(12)
+        self.group.save()
+        # The changes, then the changed group and its days
+        with self.assertNumQueries(3):
+            self.assertEqual(self.busy(), slot_mask([0], time(11), time(12)))
+
+    def test_rebuilds_when_the_day_changes(self):
+        self.busy()
+        Group.objects.filter(pk=self.group.pk).update(end_date=self.term[0] - timedelta(days=1))
+        self.bitmaps._built_on -= timedelta(days=1)
+
+        self.assertEqual(self.busy(), 0)
+        self.assertEqual(self.bitmaps.groups, {})
+
+
+class TimetableTests(TestCase):
+
+    def setUp(self):
+        self.room = Room.objects.create(name='Room 1')
+        self.group = create_group(room=self.room)
+        self.group.days.add(Weekday.objects.create(name='Monday', number=0))
+        self.client = staff_client()
+
+    def monday(self, week='2026-03-04'):
+        response = self.client.get(f'/timetable/room/{self.room.id}/', {'week': week})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['week'], '2026-03-02')
+        return [(entry['name'], entry['start_time']) for entry in response.data['days'][0]['entries']]
+
+    def test_shows_the_week_and_follows_group_edits(self):
+        self.assertEqual(self.monday(), [('Group 1', '09:00')])
+
+        self.group.start_time = time(8)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.save()
+        self.assertEqual(self.monday(), [('Group 1', '08:00')])
+
+    def test_invalid_weeks_are_bad_requests(self):
+        for week in ('2026-02-30', 'next week'):
+            response = self.client.get(f'/timetable/room/{self.room.id}/', {'week': week})
+            self.assertEqual(response.status_code, 400)
+
+
+class LessonGenerationTests(TestCase):
+
+    def setUp(self):
+        days = [Weekday.objects.create(name=name, number=number) for number, name in ((0, 'Monday'), (2, 'Wednesday'), (4, 'Friday'))]
+        self.monday, self.wednesday, self.friday = days
+        # Two weeks, from a Monday to a Sunday
+        self.group = create_group(start_date=date(2026, 3, 2), end_date=date(2026, 3, 15))
+        self.group.days.add(self.monday, self.wednesday)
+        self.client = staff_client()
+
+    def generate(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post('/lessons/generate/', {'groups': [self.group.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # One invalidation for all inserted lessons, removed ones send their own
+        self.assertEqual(len(callbacks), 1 + response.data['removed'])
+        return response.data['created'], response.data['removed']
+
+    def dates(self):
+        return [day.day for day in Lesson.objects.filter(group=self.group).order_by('date').values_list('date', flat=True)]
+
+    def test_is_idempotent(self):
+        self.assertEqual(self.generate(), (4, 0))
+        self.assertEqual(self.generate(), (0, 0))
+        self.assertEqual(self.dates(), [2, 4, 9, 11])
+
+    def test_follows_added_and_removed_days_but_keeps_edited_lessons(self):
+        self.generate()
+        Lesson.objects.filter(group=self.group, date=date(2026, 3, 11)).update(task_text='Read chapter 2')
+
+        self.group.days.remove(self.wednesday)
+        self.group.days.add(self.friday)
+        self.assertEqual(self.generate(), (2, 1))
+        self.assertEqual(self.dates(), [2, 6, 9, 11, 13])
+
+
+class LessonPublishingTests(TestCase):
+
+    def setUp(self):
+        group = create_group()
+        self.lesson = Lesson.objects.create(name='Lesson 1', group=group, task_text='Read chapter 1', task_file='task.pdf')
+        self.students = [create_student(f'+99890111111{n}', group) for n in range(2)]
+        StudentGroup.objects.filter(student=create_student('+998901111119', group)).update(status='finished')
+        self.client = staff_client()
+
+    def publish(self):
+        response = self.client.post(f'/lessons/{self.lesson.id}/publish/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['created']
+
+    def test_gives_active_students_a_placeholder_once(self):
+        self.assertEqual(self.publish(), 2)
+        late = create_student('+998901111112', self.lesson.group)
+        self.assertEqual(self.publish(), 1)
+
+        homeworks = Homework.objects.filter(lesson=self.lesson)
+        self.assertEqual(
+            sorted(homeworks.values_list('student_id', flat=True)),
+            sorted(student.id for student in self.students + [late]),
+        )
+        self.assertEqual(set(homeworks.values_list('status', 'text')), {('not_given', 'Read chapter 1')})
+        self.lesson.refresh_from_db()
+        self.assertTrue(self.lesson.is_published)
+
+
+# Queries each changelist page takes, whatever the size of the table
+CHANGELISTS = {
+    'account/customuser': 5, 'account/coursetype': 5, 'account/course': 7, 'account/adminteacher': 7,
+    'account/student': 9, 'main/weekday': 5, 'main/room': 6, 'main/group': 9, 'main/studentgroup': 7,
+    'main/lesson': 7, 'main/homework': 8, 'main/attendence': 7,
+}
+
+
+class AdminChangelistQueryTests(TestCase):
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(phone='+998900000000', email='admin@gmail.com', password='x')
+        self.client.force_login(self.admin)
+        self.weekday = Weekday.objects.create(name='Monday', number=0)
+        self.rows = 0
+
+    def add_rows(self, count):
+        start, self.rows = self.rows, self.rows + count
+        numbers = range(start, self.rows)
+
+        users = CustomUser.objects.bulk_create(
+            CustomUser(phone=f'+99891{n:07}', email=f'user{n}@gmail.com', first_name=f'User {n}') for n in numbers
+        )
+        course_types = CourseType.objects.bulk_create(CourseType(name=f'Type {n}') for n in numbers)
+        courses = Course.objects.bulk_create(
+            Course(name=f'Course {n}', price=n, course_type=course_type) for n, course_type in zip(numbers, course_types)
+        )
+        teachers = AdminTeacher.objects.bulk_create(
+            AdminTeacher(user=user, role='main_teacher', course=course) for user, course in zip(users[::2], courses)
+        )
+        students = Student.objects.bulk_create(Student(user=user, gender='M', year=2010) for user in users[1::2])
+        rooms = Room.objects.bulk_create(Room(name=f'Room {n}') for n in numbers)
+        groups = Group.objects.bulk_create(
+            Group(
+                name=f'Group {n}', course=course, teacher=teacher, room=room,
+                start_date=date(2026, 1, 1), end_date=date(2026, 6, 1), start_time=time(9), end_time=time(10),
+            )
+            for n, course, teacher, room in zip(numbers, courses, teachers * 2, rooms)
+        )
+        Group.days.through.objects.bulk_create(
+            Group.days.through(group=group, weekday=self.weekday) for group in groups
+        )
+        StudentGroup.objects.bulk_create(
+            StudentGroup(student=student, group=group) for student, group in zip(students * 2, groups)
+        )
+        lessons = Lesson.objects.bulk_create(
+            Lesson(name=f'Lesson {n}', group=group, day=self.weekday, task_text='-', task_file='task.pdf')
+            for n, group in zip(numbers, groups)
+        )
+        Homework.objects.bulk_create(
+            Homework(lesson=lesson, student=student, group=lesson.group, text='-', file='hw.pdf', status='waiting')
+            for lesson, student in zip(lessons, students * 2)
+        )
+        Attendence.objects.bulk_create(
+            Attendence(lesson=lesson, student=student, status='came') for lesson, student in zip(lessons, students * 2)
+        )
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for count in (100, 900):
+            self.add_rows(count)
+            for changelist, queries in CHANGELISTS.items():
+                with self.subTest(changelist, rows=self.rows), self.assertNumQueries(queries):
+                    response = self.client.get(f'/admin/{changelist}/')
+                self.assertEqual(response.status_code, 200, changelist)
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_generate_data_and_benchmark_against_baseline(self):
+        call_command(
+            'generate_data', users=20, teachers=2, groups=2, lessons=4, homeworks=40, attendences=30, stdout=StringIO()
+        )
+        self.assertEqual(Homework.objects.count(), 40)
+        self.assertEqual(Attendence.objects.count(), 30)
+
+        CustomUser.objects.create_superuser(phone='+998900000000', email='admin@gmail.com', password='x')
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = Path(directory) / 'baseline.json'
+            call_command('benchmark', requests=2, baseline=str(baseline), save_baseline=True, stdout=StringIO())
+            self.assertIn('admin:main/homework', baseline.read_text())
+
+            output = StringIO()
+            call_command('benchmark', requests=2, baseline=str(baseline), tolerance=100, stdout=output)
+            self.assertIn('No regressions', output.getvalue())
+
+    def test_generated_lessons_follow_the_group_schedule(self):
+        call_command(
+            'generate_data', users=20, teachers=2, groups=20, lessons=60, homeworks=1, attendences=1, stdout=StringIO()
+        )
+
+        lessons = Lesson.objects.select_related('group', 'day').prefetch_related('group__days')
+        self.assertEqual(len(lessons), 60)
+        for lesson in lessons:
+            group = lesson.group
+            self.assertTrue(group.start_date <= lesson.date <= group.end_date)
+            self.assertEqual(lesson.day.number, lesson.date.weekday())
+            self.assertIn(lesson.day, group.days.all())
+
+        for kind in ('room', 'teacher'):
+            booked = [
+                (getattr(group, f'{kind}_id'), group.start_time, day.id)
+                for group in Group.objects.prefetch_related('days') for day in group.days.all()
+            ]
+            self.assertEqual(len(booked), len(set(booked)), kind)
+
+
+class VideoUploadTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name, VIDEO_UPLOAD_TEMP_DIR=os.path.join(directory.name, 'tmp'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        user = CustomUser.objects.create_user(phone='+998901234567', email='teacher@gmail.com', password='Passw0rd!')
+        AdminTeacher.objects.create(user=user, role='admin')
+        group = Group.objects.create(
+            name='Group 1', start_date=date(2026, 1, 1), end_date=date(2026, 6, 1), start_time=time(9), end_time=time(10)
+        )
+        self.lesson = Lesson.objects.create(name='Lesson 1', group=group, task_text='-', task_file='task.pdf')
+
+        self.client = APIClient()
+        response = self.client.post('/auth/token/', {'phone': user.phone, 'password': 'Passw0rd!'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+        self.chunk_size = 64 * 1024
+        self.content = os.urandom(3 * self.chunk_size + 1000)
+
+    def start(self, content):
+        response = self.client.post(f'/lessons/{self.lesson.id}/video_uploads/', {
+            'filename': 'lecture 1.mp4',
+            'size': len(self.content),
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'chunk_size': self.chunk_size,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['chunk_count'], 4)
+        return f"/video_uploads/{response.data['id']}/"
+
+    def put_chunk(self, url, index, data=None):
+        if data is None:
+            data = self.content[index * self.chunk_size:(index + 1) * self.chunk_size]
+        return self.client.put(f'{url}chunks/{index}/', data, content_type='application/octet-stream')
+
+    def test_chunks_in_any_order_are_assembled_into_the_lesson_video(self):
+        url = self.start(self.content)
+        for index in (3, 1, 0, 1):
+            self.assertEqual(self.put_chunk(url, index).status_code, 200)
+
+        self.assertEqual(self.client.get(url).data['missing'], [2])
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, 400)
+        self.assertEqual(self.put_chunk(url, 2, b'short').status_code, 400)
+
+        self.put_chunk(url, 2)
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, 200)
+
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.video.name, 'lessons/Group_1/videos/lecture_1.mp4')
+        with self.lesson.video.open('rb') as video:
+            self.assertEqual(video.read(), self.content)
+        self.assertEqual(self.client.get(url).data['status'], 'complete')
+
+    def test_checksum_mismatch_fails_the_upload(self):
+        url = self.start(b'something else')
+        for index in range(4):
+            self.put_chunk(url, index)
+
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, 400)
+        self.lesson.refresh_from_db()
+        self.assertFalse(self.lesson.video)
+        self.assertEqual(self.client.get(url).data['status'], 'failed')
+
+    def test_chunks_after_completion_starts_are_refused(self):
+        url = self.start(self.content)
+        for index in range(4):
+            self.put_chunk(url, index)
+        VideoUpload.objects.update(status='assembling')
+
+        self.assertEqual(self.put_chunk(url, 0).status_code, 400)
+
+    def test_storage_errors_fail_the_upload(self):
+        url = self.start(self.content)
+        for index in range(4):
+            self.put_chunk(url, index)
+
+        with mock.patch.object(FileSystemStorage, 'save', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.client.post(f'{url}complete/')
+        self.assertEqual(self.client.get(url).data['status'], 'failed')
+        self.assertFalse(part_path(VideoUpload.objects.get()).exists())
+
+    def test_abandoned_uploads_expire(self):
+        abandoned, active = self.start(self.content), self.start(self.content)
+        self.put_chunk(abandoned, 0)
+        self.put_chunk(active, 0)
+        part = part_path(VideoUpload.objects.get(pk=abandoned.split('/')[-2]))
+        day_ago = (timezone.now() - timedelta(hours=25)).timestamp()
+        os.utime(part, (day_ago, day_ago))
+
+        call_command('expire_uploads', stdout=StringIO())
+        self.assertFalse(part.exists())
+        self.assertEqual(self.client.get(abandoned).data['status'], 'failed')
+        self.assertEqual(self.client.get(active).data['missing'], [1, 2, 3])
+        self.assertEqual(self.put_chunk(abandoned, 1).status_code, 400)
+
+
+class MediaServingTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        group = Group.objects.create(
+            name='Group 1', start_date=date(2026, 1, 1), end_date=date(2026, 6, 1), start_time=time(9), end_time=time(10)
+        )
+        self.lesson = Lesson.objects.create(name='Lesson 1', group=group, task_text='-', task_file='task.pdf')
+        self.content = bytes(range(256)) * 40
+        self.lesson.video.save('lecture.mp4', ContentFile(self.content))
+        self.url = f'/files/lessons/{self.lesson.id}/video/'
+
+        self.member = self.student_client('+998901111111', group)
+        self.outsider = self.student_client('+998902222222', None)
+
+    def student_client(self, phone, group):
+        user = CustomUser.objects.create_user(phone=phone, email=f'{phone}@gmail.com', password='Passw0rd!')
+        student = Student.objects.create(user=user, gender='M', year=2010)
+        if group:
+            StudentGroup.objects.create(student=student, group=group)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}")
+        return client
+
+    def test_only_group_members_get_the_file(self):
+        self.assertEqual(self.outsider.get(self.url).status_code, 403)
+
+        response = self.member.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_ranges_and_conditional_requests(self):
+        response = self.member.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.member.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        self.assertEqual(self.member.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-').status_code, 416)
+
+        etag = response['ETag']
+        self.assertEqual(self.member.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.member.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_the_owner_and_staff_get_a_homework_file(self):
+        student = Student.objects.get(user__phone='+998901111111')
+        homework = Homework.objects.create(lesson=self.lesson, student=student, group=self.lesson.group, status='waiting')
+        homework.file.save('answer.pdf', ContentFile(b'my answer'))
+        url = f'/files/homeworks/{homework.id}/'
+
+        response = self.member.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'my answer')
+        self.assertEqual(self.outsider.get(url).status_code, 403)
+        self.assertEqual(staff_client().get(url).status_code, 200)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_offload_to_the_web_server(self):
+        response = self.member.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.lesson.video.name}')
+        self.assertEqual(response.content, b'')
+
+
+class BlobStorageTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.group = Group.objects.create(
+            name='Group 1', start_date=date(2026, 1, 1), end_date=date(2026, 6, 1), start_time=time(9), end_time=time(10)
+        )
+        self.lesson = Lesson.objects.create(name='Lesson 1', group=self.group, task_text='-', task_file='task.pdf')
+
+    def submit(self, phone, content, filename='worksheet.pdf'):
+        user = CustomUser.objects.create_user(phone=phone, email=f'{phone}@gmail.com', password='x')
+        student = Student.objects.create(user=user, gender='M', year=2010)
+        homework = Homework(lesson=self.lesson, student=student, group=self.group, text='-', status='waiting')
+        homework.file.save(filename, ContentFile(content), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            homework.save()
+        return homework
+
+    def test_identical_files_share_one_blob_until_the_last_reference_goes(self):
+        first = self.submit('+998901111111', b'worksheet')
+        second = self.submit('+998902222222', b'worksheet', 'copy.PDF')
+        other = self.submit('+998903333333', b'something else')
+
+        self.assertEqual(first.file.name, second.file.name)
+        digest = hashlib.sha256(b'worksheet').hexdigest()
+        self.assertEqual(first.file.name, f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf')
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(Blob.objects.get(name=first.file.name).refs, 2)
+
+        storage = first.file.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.file = ContentFile(b'replaced', name='new.pdf')
+            second.save()
+        self.assertFalse(storage.exists(first.file.name))
+        self.assertFalse(Blob.objects.filter(name=first.file.name).exists())
+
+    def test_clearing_a_file_releases_its_blob(self):
+        homework = self.submit('+998901111111', b'worksheet')
+        name = homework.file.name
+
+        homework.file = None
+        with self.captureOnCommitCallbacks(execute=True):
+            homework.save()
+        self.assertFalse(homework.file.storage.exists(name))
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+
+    def test_rows_given_a_stored_name_count_as_references(self):
+        first = self.submit('+998901111111', b'worksheet')
+        second = self.submit('+998902222222', b'something else')
+
+        second.file = first.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            second.save()
+        self.assertEqual(Blob.objects.get(name=first.file.name).refs, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(second.file.storage.exists(second.file.name))
+        self.assertEqual(Blob.objects.get(name=second.file.name).refs, 1)
+
+    def test_uploads_are_hashed_as_they_are_received(self):
+        for max_memory_size in (2621440, 0):
+            with self.subTest(max_memory_size=max_memory_size), self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=max_memory_size):
+                request = RequestFactory().post('/', {'file': SimpleUploadedFile('worksheet.pdf', b'worksheet')})
+                self.assertEqual(request.FILES['file'].sha256, hashlib.sha256(b'worksheet').hexdigest())
+
+        # The storage trusts the digest instead of reading the file again
+        upload = ContentFile(b'worksheet', name='worksheet.pdf')
+        upload.sha256 = 'ab' * 32
+        self.assertEqual(blob_storage.save('worksheet.pdf', upload), f"blobs/ab/ab/{'ab' * 32}.pdf")
+
+
+class AsyncReadEndpointTests(TestCase):
+
+    def setUp(self):
+        group = Group.objects.create(
+            name='Group 1', start_date=date(2026, 1, 1), end_date=date(2026, 6, 1), start_time=time(9), end_time=time(10)
+        )
+        lesson = Lesson.objects.create(name='Lesson 1', group=group, task_text='-', task_file='task.pdf')
+        self.students = []
+        for phone in ('+998901111111', '+998902222222'):
+            user = CustomUser.objects.create_user(phone=phone, email=f'{phone}@gmail.com', password='x')
+            student = Student.objects.create(user=user, gender='M', year=2010)
+            Homework.objects.bulk_create(
+                Homework(lesson=lesson, student=student, group=group, text=str(n), status='waiting') for n in range(3)
+            )
+            self.students.append(student)
+
+        teacher = CustomUser.objects.create_user(phone='+998903333333', email='teacher@gmail.com', password='x')
+        AdminTeacher.objects.create(user=teacher, role='admin')
+        self.staff = self.client_for(teacher)
+        self.student = self.client_for(self.students[0].user)
+
+    def client_for(self, user):
+        token = RoleTokenObtainPairSerializer.get_token(user).access_token
+        return AsyncClient(authorization=f'Bearer {token}')
+
+    async def test_students_page_through_their_own_homeworks(self):
+        response = await self.student.get('/async/homeworks/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertEqual(len(first['results']), 2)
+
+        response = await self.student.get(first['next'])
+        second = response.json()
+        self.assertIsNone(second['next'])
+
+        homeworks = first['results'] + second['results']
+        self.assertEqual({homework['student'] for homework in homeworks}, {self.students[0].id})
+        self.assertEqual(len({homework['id'] for homework in homeworks}), 3)
+
+    async def test_staff_only_endpoints(self):
+        self.assertEqual((await self.student.get('/async/teacher_admins/')).status_code, 403)
+        self.assertEqual((await AsyncClient().get('/async/teacher_admins/')).status_code, 401)
+
+        response = await self.staff.get('/async/teacher_admins/')
+        self.assertEqual(len(response.json()['results']), 1)
+        response = await self.staff.get('/async/homeworks/', {'student': self.students[1].id})
+        self.assertEqual(len(response.json()['results']), 3)
+        response = await self.staff.get(f'/async/timetable/student/{self.students[0].id}/')
+        self.assertEqual(len(response.json()['days']), 7)
+
+        for week in ('2026-02-30', 'next week'):
+            response = await self.staff.get(f'/async/timetable/student/{self.students[0].id}/', {'week': week})
+            self.assertEqual(response.status_code, 400)
+
+
+class BranchShardingTests(TestCase):
+
+    def test_router_keeps_branch_rows_in_their_shard(self):
+        router = BranchRouter()
+        with override_settings(BRANCH_DATABASES={'chilonzor': 'default', 'yunusobod': 'branch_yunusobod'}):
+            with use_branch('yunusobod'):
+                self.assertEqual(router.db_for_read(Student), 'branch_yunusobod')
+                self.assertEqual(router.db_for_write(Weekday), 'default')
+            self.assertEqual(router.db_for_write(Group, instance=Group(branch='yunusobod')), 'branch_yunusobod')
+
+            group = Group(branch='yunusobod')
+            group._state.db = 'branch_yunusobod'
+            self.assertEqual(router.db_for_read(Lesson, instance=group), 'branch_yunusobod')
+            # Shared rows related to a branch row are read through the shard's attached copy
+            self.assertEqual(router.db_for_read(Weekday, instance=group), 'branch_yunusobod')
+            self.assertEqual(router.db_for_read(Weekday), 'default')
+
+            self.assertTrue(router.allow_migrate('branch_yunusobod', 'main', 'group_days'))
+            self.assertFalse(router.allow_migrate('branch_yunusobod', 'account', 'customuser'))
+            self.assertTrue(router.allow_migrate('default', 'account', 'customuser'))
+
+    @override_settings(BRANCH_DATABASES={'chilonzor': 'default', 'yunusobod': 'default'})
+    def test_token_branch_and_cross_branch_report(self):
+        for number, branch in enumerate(('chilonzor', 'yunusobod')):
+            with use_branch(branch):
+                user = CustomUser.objects.create_user(phone=f'+99890000000{number}', email=f'{branch}@gmail.com', password='x')
+                AdminTeacher.objects.create(user=user, role='admin')
+                Room.objects.create(name=f'{branch} 1')
+                self.assertEqual(RoleTokenObtainPairSerializer.get_token(user)['branch'], branch)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}')
+        response = client.get('/reports/branches/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['branch'] for row in response.data['branches']], ['chilonzor', 'yunusobod'])
+        self.assertEqual(response.data['total']['teachers'], 2)
+        self.assertEqual(response.data['total']['rooms'], 2)
+
+
+
+class RealShardTests(TransactionTestCase):
+    """Two branch databases of their own next to the default one, like BRANCHES=chilonzor,yunusobod."""
+    databases = '__all__'
+    branches = {'chilonzor': 'branch_chilonzor', 'yunusobod': 'branch_yunusobod'}
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        for branch, alias in cls.branches.items():
+            connections.settings[alias] = {
+                **connections.settings['default'],
+                'NAME': os.path.join(directory.name, f'db_{branch}.sqlite3'),
+                'ATTACH': {'shared': 'default'},
+            }
+        cls.addClassCleanup(cls.remove_shards)
+        cls.enterClassContext(override_settings(BRANCH_DATABASES=cls.branches, DEFAULT_BRANCH='chilonzor'))
+        for alias in cls.branches.values():
+            call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def remove_shards(cls):
+        for alias in cls.branches.values():
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    def test_deleting_a_user_deletes_their_rows_in_every_shard(self):
+        user = CustomUser.objects.create_user(phone='+998901111111', email='both@gmail.com', password='x')
+        with use_branch('chilonzor'):
+            AdminTeacher.objects.create(user=user, role='admin')
+        with use_branch('yunusobod'):
+            student = Student.objects.create(user=user, gender='M', year=2010)
+            StudentGroup.objects.create(student=student, group=create_group())
+
+        user.delete()
+
+        self.assertFalse(CustomUser.objects.filter(pk=user.pk).exists())
+        self.assertFalse(AdminTeacher.objects.using('branch_chilonzor').exists())
+        self.assertFalse(Student.objects.using('branch_yunusobod').exists())
+        self.assertFalse(StudentGroup.objects.using('branch_yunusobod').exists())
+
+    def test_services_commit_and_roll_back_in_the_branch_database(self):
+        monday = Weekday.objects.create(name='Monday', number=0)
+        with use_branch('yunusobod'):
+            group = create_group(start_date=date(2026, 3, 2), end_date=date(2026, 3, 8))
+            group.days.add(monday)
+            student = create_student('+998901111111', group)
+            self.assertEqual(generate_lessons(Group.objects.all()), (1, 0))
+            lesson = Lesson.objects.get()
+
+            with mock.patch('main.services.Lesson') as failing, self.assertRaises(RuntimeError):
+                failing.objects.filter.side_effect = RuntimeError
+                publish_lesson(lesson)
+            self.assertFalse(Homework.objects.exists())
+
+            self.assertEqual(publish_lesson(lesson), 1)
+            grade_homeworks([{'homework': Homework.objects.get().id, 'status': 'done', 'ball': 90, 'xp': 10, 'coins': 5}])
+            student.refresh_from_db()
+            self.assertEqual((student.xp, student.coins), (10, 5))
+
+        self.assertFalse(Lesson.objects.using('branch_chilonzor').exists())
+
+    def test_copies_rows_of_the_default_database_into_their_shards(self):
+        # Written before BRANCHES was set, where the router no longer looks
+        user = CustomUser.objects.create_user(phone='+998901111111', email='student@gmail.com', password='x')
+        monday = Weekday.objects.create(name='Monday', number=0)
+        rooms = Room.objects.using('default').bulk_create([Room(name='1', branch='chilonzor'), Room(name='2', branch='yunusobod')])
+        groups = Group.objects.using('default').bulk_create([
+            Group(name=f'Group {room.name}', room=room, branch=room.branch, start_date=date(2026, 1, 1),
+                  end_date=date(2026, 6, 1), start_time=time(9), end_time=time(10))
+            for room in rooms
+        ])
+        Group.days.through.objects.using('default').bulk_create(
+            Group.days.through(group=group, weekday=monday) for group in groups
+        )
+        [student] = Student.objects.using('default').bulk_create([Student(user=user, gender='M', year=2010, branch='yunusobod')])
+        [lesson] = Lesson.objects.using('default').bulk_create([Lesson(name='Lesson 1', group=groups[1], task_text='-')])
+        Homework.objects.using('default').bulk_create([Homework(lesson=lesson, student=student, group=groups[1], status='waiting')])
+
+        # A membership in another branch's group has no shard to go to
+        [split] = StudentGroup.objects.using('default').bulk_create([StudentGroup(student=student, group=groups[0])])
+        with self.assertRaisesMessage(CommandError, 'another branch than their student'):
+            call_command('copy_to_shards', stdout=StringIO())
+        split.delete(using='default')
+        StudentGroup.objects.using('default').bulk_create([StudentGroup(student=student, group=groups[1])])
+
+        call_command('copy_to_shards', stdout=StringIO())
+
+        self.assertEqual(list(Room.objects.using('branch_chilonzor').values_list('name', flat=True)), ['1'])
+        self.assertFalse(Student.objects.using('branch_chilonzor').exists())
+        with use_branch('yunusobod'):
+            group = Group.objects.get()
+            self.assertEqual((group.name, group.room.name), ('Group 2', '2'))
+            self.assertEqual(list(group.days.all()), [monday])
+            self.assertEqual(StudentGroup.objects.get().student.user, user)
+            self.assertEqual(Homework.objects.get().lesson, Lesson.objects.get())
+        with self.assertRaisesMessage(CommandError, 'already has rows'):
+            call_command('copy_to_shards', stdout=StringIO())
+
+
+@override_settings(DATABASE_REPLICAS={'default': ['default_replica']})
+class ReadReplicaTests(TransactionTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # A cache every process on the host sees, like Redis
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.enterClassContext(override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory.name,
+            'KEY_FUNCTION': 'config.db_routers.make_cache_key',
+        }}))
+        super().setUpClass()
+
+    def test_router_reads_replica_only_when_allowed(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Student), 'default')
+        with use_replica(True):
+            self.assertEqual(router.db_for_read(Student), 'default_replica')
+            self.assertEqual(router.db_for_write(Student), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Student), 'default')
+
+            # Rows read from the replica are saved to the primary
+            room = Room(name='1')
+            room._state.db = 'default_replica'
+            self.assertEqual(router.db_for_write(Room, instance=room), 'default')
+            other = Room(name='2')
+            other._state.db = 'default'
+            self.assertTrue(router.allow_relation(room, other))
+        self.assertFalse(router.allow_migrate('default_replica', 'main', 'room'))
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        router, seen = ReplicaRouter(), []
+
+        def view(request):
+            seen.append(router.db_for_read(Student))
+            return HttpResponse(status=200 if request.method == 'GET' else 201)
+
+        middleware = ReplicaMiddleware(view)
+        factory = RequestFactory()
+        user = CustomUser.objects.create_user(phone='+998900000001', email='writer@gmail.com', password='x')
+
+        middleware(factory.get('/'))
+        request = factory.post('/')
+        request.user = user
+        response = middleware(request)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(is_pinned(user.id))
+
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(seen, ['default_replica', 'default', 'default'])
+
+    def test_pins_need_a_shared_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                ReplicaMiddleware(HttpResponse)
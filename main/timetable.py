@@ -0,0 +1,104 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .caching import bump_version, get_version
+from .models import Group, Lesson, StudentGroup
+
+
+KINDS = ('room', 'teacher', 'student')
+CACHE_KEY = 'timetable:{kind}:{id}:v{version}:{monday}'
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _groups(kind, resource_id, monday, sunday):
+    queryset = Group.objects.filter(start_date__lte=sunday, end_date__gte=monday)
+    if kind == 'room':
+        queryset = queryset.filter(room_id=resource_id)
+    elif kind == 'teacher':
+        queryset = queryset.filter(teacher_id=resource_id)
+    else:
+        queryset = queryset.filter(students__student_id=resource_id, students__status='active')
+
+    return (
+        queryset
+        .select_related('room', 'course', 'teacher__user')
+        .prefetch_related('days')
+        .order_by('start_time', 'id')
+    )
+
+
+def build_timetable(kind, resource_id, monday):
+    sunday = monday + timedelta(days=6)
+    groups = list(_groups(kind, resource_id, monday, sunday))
+
+    # Dated lessons belong to their own date, undated ones to every week
+    lessons = defaultdict(list)
+    dated = Q(date__range=(monday, sunday)) | Q(date__isnull=True, day__isnull=False)
+    for lesson in Lesson.objects.filter(dated, group__in=groups).values('id', 'name', 'group_id', 'day_id', 'date'):
+        key = (lesson['group_id'], lesson['date'] or lesson['day_id'])
+        lessons[key].append({'id': lesson['id'], 'name': lesson['name']})
+
+    days = []
+    for offset in range(7):
+        date = monday + timedelta(days=offset)
+        entries = []
+        for group in groups:
+            if not group.start_date <= date <= group.end_date:
+                continue
+            for weekday in group.days.all():
+                if weekday.number != offset:
+                    continue
+                entries.append({
+                    'group': group.id,
+                    'name': group.name,
+                    'start_time': group.start_time.strftime('%H:%M'),
+                    'end_time': group.end_time.strftime('%H:%M'),
+                    'room': group.room.name if group.room else None,
+                    'course': group.course.name if group.course else None,
+                    'teacher': group.teacher.user.fullname if group.teacher else None,
+                    'lessons': lessons[(group.id, date)] + lessons[(group.id, weekday.id)],
+                })
+        days.append({'date': date.isoformat(), 'entries': entries})
+
+    return {'kind': kind, 'id': resource_id, 'week': monday.isoformat(), 'days': days}
+
+
+def get_timetable(kind, resource_id, day):
+    """
+    Timetable of the week containing `day`, served from the cache. Keys carry
+    a per-resource version so invalidation never has to find old weeks.
+    """
+    monday = week_start(day)
+    version = get_version(f'timetable:{kind}:{resource_id}')
+    key = CACHE_KEY.format(kind=kind, id=resource_id, version=version, monday=monday.isoformat())
+
+    timetable = cache.get(key)
+    if timetable is None:
+        timetable = build_timetable(kind, resource_id, monday)
+        cache.set(key, timetable, timeout=settings.TIMETABLE_CACHE_TIMEOUT)
+
+    return timetable
+
+
+def invalidate(resources):
+    for kind, resource_id in set(resources):
+        if resource_id is not None:
+            bump_version(f'timetable:{kind}:{resource_id}')
+
+
+def group_resources(group_ids, rooms=(), teachers=()):
+    """Every timetable the given groups appear on."""
+    resources = [('room', room_id) for room_id in rooms]
+    resources += [('teacher', teacher_id) for teacher_id in teachers]
+    for room_id, teacher_id in Group.objects.filter(pk__in=group_ids).values_list('room_id', 'teacher_id'):
+        resources += [('room', room_id), ('teacher', teacher_id)]
+    members = StudentGroup.objects.filter(group_id__in=group_ids, status='active').values_list('student_id', flat=True)
+    resources += [('student', student_id) for student_id in members]
+    return resources
@@ -0,0 +1,200 @@
+import fcntl
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import router, transaction
+from django.utils import timezone
+
+from config.db_routers import shard_databases
+from .models import Lesson, VideoUpload, VideoUploadChunk
+
+
+READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class AssembledFile(File):
+    """Lets FileSystemStorage move the assembled file into place instead of copying it."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(upload):
+    return Path(settings.VIDEO_UPLOAD_TEMP_DIR) / f'{upload.id}.part'
+
+
+def start_upload(lesson, filename, size, sha256, chunk_size, user_id=None):
+    upload = VideoUpload.objects.create(
+        lesson=lesson, created_by_id=user_id, filename=filename, size=size, sha256=sha256, chunk_size=chunk_size
+    )
+    path = part_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Full size up front, so chunks can be written at their offsets in any order
+    with open(path, 'wb') as file:
+        file.truncate(size)
+    return upload
+
+
+def write_chunk(upload, index, stream, sha256=None):
+    """
+    Streams chunk `index` from `stream` straight into its place in the part
+    file, READ_SIZE bytes at a time. Chunks of one upload can be written
+    concurrently and retried, they never share a file position.
+
+    Writers hold a shared lock on the part file and complete_upload an
+    exclusive one, so the status checked here can't change until the chunk
+    is written and recorded.
+    """
+    if not 0 <= index < upload.chunk_count:
+        raise UploadError(f"Chunk index must be between 0 and {upload.chunk_count - 1}!")
+
+    length = upload.chunk_length(index)
+    offset = index * upload.chunk_size
+    digest = hashlib.sha256()
+    received = 0
+
+    try:
+        fd = os.open(part_path(upload), os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadError("This upload is already finished!")
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        if not VideoUpload.objects.filter(pk=upload.pk, status='uploading').exists():
+            raise UploadError("This upload is already finished!")
+
+        while received < length:
+            data = stream.read(min(READ_SIZE, length - received))
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset + received)
+                digest.update(view[:written])
+                received += written
+                view = view[written:]
+
+        if received != length or stream.read(1):
+            raise UploadError(f"Chunk {index} must be exactly {length} bytes!")
+        if sha256 and sha256.lower() != digest.hexdigest():
+            raise UploadError(f"Chunk {index} checksum does not match, send it again!")
+
+        VideoUploadChunk.objects.get_or_create(upload=upload, index=index)
+    finally:
+        # Also releases the lock
+        os.close(fd)
+
+    return digest.hexdigest()
+
+
+def missing_chunks(upload):
+    received = set(upload.chunks.values_list('index', flat=True))
+    return [index for index in range(upload.chunk_count) if index not in received]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while data := file.read(READ_SIZE):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def complete_upload(upload):
+    """
+    Verifies the assembled file against the checksum given at the start and
+    moves it into Lesson.video. The lesson only ever points at a complete
+    file, and a replaced video is deleted once the switch is committed. Any
+    error after assembling starts fails the upload and drops its part file.
+    """
+    path = part_path(upload)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        raise UploadError("This upload is already finished!")
+    try:
+        # Waits for the chunks being written, later ones see the new status
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        missing = missing_chunks(upload)
+        if missing:
+            raise UploadError(f"Chunks {missing[:20]} are missing!")
+
+        # Only one request gets to assemble an upload
+        if not VideoUpload.objects.filter(pk=upload.pk, status='uploading').update(status='assembling'):
+            raise UploadError("This upload is already finished!")
+    finally:
+        os.close(fd)
+
+    try:
+        if file_sha256(path) != upload.sha256:
+            raise UploadError("File checksum does not match, upload it again!")
+
+        lesson = Lesson.objects.select_related('group').get(pk=upload.lesson_id)
+        storage = lesson.video.storage
+        old_name = lesson.video.name
+        with open(path, 'rb') as file:
+            name = storage.save(
+                lesson.video.field.generate_filename(lesson, upload.filename),
+                AssembledFile(file),
+                max_length=lesson.video.field.max_length,
+            )
+    except Exception:
+        VideoUpload.objects.filter(pk=upload.pk).update(status='failed')
+        path.unlink(missing_ok=True)
+        raise
+    path.unlink(missing_ok=True)
+
+    try:
+        using = router.db_for_write(VideoUpload, instance=upload)
+        with transaction.atomic(using=using):
+            Lesson.objects.filter(pk=lesson.pk).update(video=name)
+            VideoUpload.objects.filter(pk=upload.pk).update(status='complete')
+            upload.chunks.all().delete()
+            if old_name and old_name != name:
+                transaction.on_commit(lambda: storage.delete(old_name), using=using)
+    except Exception:
+        storage.delete(name)
+        VideoUpload.objects.filter(pk=upload.pk).update(status='failed')
+        raise
+
+    upload.status = 'complete'
+    return name
+
+
+def expire_uploads(age):
+    """
+    Fails the unfinished uploads whose part file nobody wrote to for `age`
+    (a timedelta) and deletes their part files, along with the ones no
+    upload owns any more. Returns the number of part files deleted.
+    """
+    directory = Path(settings.VIDEO_UPLOAD_TEMP_DIR)
+    if not directory.is_dir():
+        return 0
+
+    cutoff = (timezone.now() - age).timestamp()
+    deleted = 0
+    for path in directory.glob('*.part'):
+        try:
+            upload_id = uuid.UUID(path.stem)
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except (ValueError, FileNotFoundError):
+            continue
+
+        # Part files of every branch share the directory
+        for alias in shard_databases():
+            with transaction.atomic(using=alias):
+                uploads = VideoUpload.objects.using(alias).filter(pk=upload_id, status__in=('uploading', 'assembling'))
+                uploads.update(status='failed')
+                VideoUploadChunk.objects.using(alias).filter(upload_id=upload_id).delete()
+        path.unlink(missing_ok=True)
+        deleted += 1
+
+    return deleted
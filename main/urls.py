@@ -1,16 +1,55 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedSimpleRouter
+from . import async_views
 from .views import (
     AdminHomeView,
+    AttendenceView,
+    HomeworkView,
+    LeaderboardView,
+    ScheduleView,
+    ReportView,
+    TimetableView,
+    LessonView,
+    VideoUploadView,
+    MediaView,
 )
 
 # ADMIN router
 
 router = DefaultRouter()
 router.register('teacher_admins', AdminHomeView, basename='admin')
+router.register('attendences', AttendenceView, basename='attendence')
+router.register('homeworks', HomeworkView, basename='homework')
+router.register('leaderboard', LeaderboardView, basename='leaderboard')
+router.register('schedule', ScheduleView, basename='schedule')
+router.register('reports', ReportView, basename='report')
+router.register('lessons', LessonView, basename='lesson')
+router.register('video_uploads', VideoUploadView, basename='video_upload')
 
 
 urlpatterns = [
     *router.urls,
-]
\ No newline at end of file
+    path(
+        'timetable/<str:kind>/<int:pk>/',
+        TimetableView.as_view({'get': 'retrieve'}),
+        name='timetable'
+    ),
+    path(
+        'files/lessons/<int:pk>/<str:field>/',
+        MediaView.as_view({'get': 'lesson'}),
+        name='lesson_file'
+    ),
+    path(
+        'files/homeworks/<int:pk>/',
+        MediaView.as_view({'get': 'homework'}),
+        name='homework_file'
+    ),
+
+    # Async (ASGI) read endpoints, see async_views
+    path('async/teacher_admins/', async_views.teacher_list, name='async_teacher_list'),
+    path('async/teacher_admins/<int:pk>/', async_views.teacher_detail, name='async_teacher_detail'),
+    path('async/homeworks/', async_views.homework_feed, name='async_homework_feed'),
+    path('async/attendences/', async_views.attendence_list, name='async_attendence_list'),
+    path('async/timetable/<str:kind>/<int:pk>/', async_views.timetable, name='async_timetable'),
+]
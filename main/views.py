@@ -1,23 +1,40 @@
 from django.core.serializers import serialize
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.db import transaction
 from django.shortcuts import render, get_list_or_404, get_object_or_404
 from rest_framework import viewsets, mixins
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 
-from rest_framework.permissions import BasePermission
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.settings import api_settings
 
 
 from .models import (
     Weekday, Room, Attendence,
     Group, StudentGroup, Lesson,
-    Homework, 
+    Homework, VideoUpload,
 )
 from .serializers import (
     WeekDaySerializer, RoomSerializer,
     AttendenceSerailizer, GroupSerializer,
     StudentGroupSerializer, LessonSerializer,
-    HomeworkSerializer
+    HomeworkSerializer, RollCallSerializer,
+    HomeworkGradeSerializer, FreeSlotQuerySerializer,
+    LessonGenerateSerializer, VideoUploadSerializer
 )
+from .services import grade_homeworks, generate_lessons, publish_lesson
+from .leaderboard import leaderboard, SCOPES
+from .schedule import slot_bitmaps, free_slots
+from .timetable import get_timetable, KINDS as TIMETABLE_KINDS
+from .files import serve_file
+from .reports import branch_report
+from .uploads import UploadError, start_upload, write_chunk, missing_chunks, complete_upload
 
 
 from account.models import (
@@ -27,8 +44,9 @@ from account.models import (
 from account.serializers import (
     CourseSerializer, CourseTypeSerializer,
     AdminTeacherSerializer, StudentSerializer,
-    CustomUserSerializer
+    CustomUserSerializer, AdminTeacherOnboardSerializer
 )
+from account.tokens import ADMIN_ROLES, claims_are_stale
 
 
 # Create your views here.
@@ -37,19 +55,27 @@ from account.serializers import (
 
 class AdminEnterPermission(BasePermission):
     def has_permission(self, request, view):
-        return request.user and AdminTeacher.objects.filter(user__id = request.user.id).exists()
+        token = request.auth
+        if token is None or 'role' not in token:
+            # Tokens issued before role claims existed still need the lookup
+            return bool(request.user) and AdminTeacher.objects.filter(user__id = request.user.id, is_active=True).exists()
+
+        return token['role'] in ADMIN_ROLES and not claims_are_stale(token)
     
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        return obj.user_id == request.user.id
 
 
 class AdminHomeView(viewsets.ViewSet):
     permission_classes = [AdminEnterPermission]
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
 
     def list(self, request):
         queryset = AdminTeacher.objects.select_related("user").all()
-        data = AdminTeacherSerializer(queryset, many=True).data
-        return Response(data, status=status.HTTP_200_OK)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        data = AdminTeacherSerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
 
     def retrieve(self, request, pk):
         obj = get_object_or_404(AdminTeacher.objects.select_related("user"), pk=pk)
@@ -63,21 +89,36 @@ class AdminHomeView(viewsets.ViewSet):
         if not user_serializer.is_valid():
             return Response(user_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        user = user_serializer.save()
+        with transaction.atomic():
+            user = user_serializer.save()
 
-        admin_data = request.data.copy()
-        admin_data["user"] = user.id
+            admin_data = request.data.copy()
+            admin_data["user"] = user.id
 
-        admin_serializer = AdminTeacherSerializer(data=admin_data)
-        if not admin_serializer.is_valid():
-            return Response(admin_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            admin_serializer = AdminTeacherSerializer(data=admin_data)
+            if not admin_serializer.is_valid():
+                transaction.set_rollback(True)
+                return Response(admin_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            admin = admin_serializer.save()
 
-        admin = admin_serializer.save()
         return Response(
             {"message": "success", "data": AdminTeacherSerializer(admin).data},
             status=status.HTTP_201_CREATED
         )
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        serializer = AdminTeacherOnboardSerializer(data=request.data, many=True, allow_empty=False)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        admins = serializer.save()
+        return Response(
+            {"message": "success", "data": AdminTeacherSerializer(admins, many=True).data},
+            status=status.HTTP_201_CREATED
+        )
+
     def update(self, request, pk):
         admin_instance = get_object_or_404(AdminTeacher, pk=pk)
 
@@ -107,6 +148,273 @@ class AdminHomeView(viewsets.ViewSet):
         
         admin_teacher.delete()
         return Response({"message": "deleted"}, status=status.HTTP_204_NO_CONTENT)
-    
 
 
+class AttendenceView(viewsets.ViewSet):
+    permission_classes = [AdminEnterPermission]
+
+    @action(detail=False, methods=['post'], url_path='roll_call')
+    def roll_call(self, request):
+        serializer = RollCallSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = serializer.save()
+        return Response({"message": "success", "count": len(rows)}, status=status.HTTP_200_OK)
+
+
+class HomeworkView(viewsets.ViewSet):
+    permission_classes = [AdminEnterPermission]
+
+    @action(detail=False, methods=['post'], url_path='grade')
+    def grade(self, request):
+        many = isinstance(request.data, list)
+        serializer = HomeworkGradeSerializer(data=request.data, many=many)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        grades = serializer.validated_data if many else [serializer.validated_data]
+        homeworks = grade_homeworks(grades)
+        return Response(HomeworkSerializer(homeworks, many=True).data, status=status.HTTP_200_OK)
+
+
+class LeaderboardView(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def get_board(self, request):
+        scope = request.query_params.get('scope', 'global')
+        if scope not in SCOPES:
+            return None, Response({"scope": f"Scope must be one of {SCOPES}!"}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope_id = None
+        if scope != 'global':
+            try:
+                scope_id = int(request.query_params['id'])
+            except (KeyError, ValueError):
+                return None, Response({"id": f"An integer {scope} id is required!"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return leaderboard.board(scope, scope_id), None
+
+    def list(self, request):
+        board, error = self.get_board(request)
+        if error:
+            return error
+
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), 100)
+        except ValueError:
+            return Response({"detail": "offset and limit must be integers!"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = board.page(offset, limit)
+        names = {
+            student_id: f"{first_name} {last_name}".strip()
+            for student_id, first_name, last_name in Student.objects
+            .filter(id__in=[student_id for _, student_id, _ in rows])
+            .values_list('id', 'user__first_name', 'user__last_name')
+        }
+        results = [
+            {"rank": rank, "student": student_id, "name": names.get(student_id), "xp": xp}
+            for rank, student_id, xp in rows
+        ]
+        return Response({"count": len(board), "results": results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='me')
+    def me(self, request):
+        student_id = getattr(request.user, 'student_id', None)
+        if student_id is None:
+            return Response({"detail": "Only students have a rank!"}, status=status.HTTP_404_NOT_FOUND)
+
+        board, error = self.get_board(request)
+        if error:
+            return error
+
+        rank = board.rank(student_id)
+        if rank is None:
+            return Response({"detail": "You are not on this leaderboard!"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(
+            {"rank": rank, "student": student_id, "xp": board.xp[student_id], "count": len(board)},
+            status=status.HTTP_200_OK
+        )
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class ScheduleView(viewsets.ViewSet):
+    permission_classes = [AdminEnterPermission]
+
+    @action(detail=False, methods=['get'], url_path='free_slots')
+    def free_slots(self, request):
+        serializer = FreeSlotQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+
+        resources = [(kind, params[kind]) for kind in ('room', 'teacher') if params.get(kind)]
+        busy = slot_bitmaps.busy(resources, params['date_from'], params['date_to'])
+
+        days = (params['date_to'] - params['date_from']).days + 1
+        numbers = {(params['date_from'] + timedelta(days=offset)).weekday() for offset in range(min(days, 7))}
+        weekdays = Weekday.objects.filter(number__in=numbers).order_by('number')
+
+        slots = free_slots(
+            busy, [weekday.number for weekday in weekdays],
+            settings.SCHEDULE_DAY_START, settings.SCHEDULE_DAY_END, params['duration']
+        )
+        data = [
+            {
+                "weekday": weekday.id,
+                "name": weekday.name,
+                "free": [
+                    {"start": format_minutes(start), "end": format_minutes(end)}
+                    for start, end in slots[weekday.number]
+                ],
+            }
+            for weekday in weekdays
+        ]
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ReportView(viewsets.ViewSet):
+    permission_classes = [AdminEnterPermission]
+
+    @action(detail=False, methods=['get'], url_path='branches')
+    def branches(self, request):
+        return Response(branch_report(), status=status.HTTP_200_OK)
+
+
+class TimetableView(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def retrieve(self, request, kind, pk):
+        if kind not in TIMETABLE_KINDS:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        role = getattr(request.user, 'role', None)
+        own = kind == 'student' and getattr(request.user, 'student_id', None) == int(pk)
+        if role not in ADMIN_ROLES and not own:
+            return Response({"detail": "You can only see your own timetable!"}, status=status.HTTP_403_FORBIDDEN)
+
+        week = request.query_params.get('week')
+        try:
+            day = parse_date(week) if week else timezone.localdate()
+        except ValueError:
+            # Well formed but not a real date, like 2026-02-30
+            day = None
+        if day is None:
+            return Response({"week": "Use the YYYY-MM-DD format!"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_timetable(kind, int(pk), day), status=status.HTTP_200_OK)
+
+
+class LessonView(viewsets.ViewSet):
+    permission_classes = [AdminEnterPermission]
+
+    @action(detail=False, methods=['post'], url_path='generate')
+    def generate(self, request):
+        serializer = LessonGenerateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        groups = Group.objects.filter(pk__in=serializer.validated_data['groups'])
+        created, removed = generate_lessons(groups)
+        return Response({"message": "success", "created": created, "removed": removed}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], url_path='publish')
+    def publish(self, request, pk):
+        lesson = get_object_or_404(Lesson, pk=pk)
+        created = publish_lesson(lesson)
+        return Response({"message": "success", "created": created}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], url_path='video_uploads')
+    def video_upload(self, request, pk):
+        lesson = get_object_or_404(Lesson, pk=pk)
+        serializer = VideoUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = start_upload(lesson, user_id=request.user.id, **serializer.validated_data)
+        return Response(
+            {"id": upload.id, "chunk_size": upload.chunk_size, "chunk_count": upload.chunk_count},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class VideoUploadView(viewsets.ViewSet):
+    """
+    Resumable lesson video uploads: PUT each chunk's raw bytes to
+    chunks/<index>/ (in any order, in parallel, retried as often as needed),
+    check what is missing with GET, then POST complete/.
+    """
+    permission_classes = [AdminEnterPermission]
+    lookup_value_regex = '[0-9a-f-]{36}'
+
+    def retrieve(self, request, pk):
+        upload = get_object_or_404(VideoUpload, pk=pk)
+        return Response({
+            "id": upload.id,
+            "lesson": upload.lesson_id,
+            "filename": upload.filename,
+            "status": upload.status,
+            "size": upload.size,
+            "chunk_size": upload.chunk_size,
+            "chunk_count": upload.chunk_count,
+            "missing": missing_chunks(upload) if upload.status == 'uploading' else [],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk, index):
+        upload = get_object_or_404(VideoUpload, pk=pk)
+        try:
+            # Read straight from the request stream, the body is never buffered
+            sha256 = write_chunk(upload, int(index), request.stream, request.headers.get('X-Chunk-SHA256'))
+        except UploadError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"index": int(index), "sha256": sha256}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], url_path='complete')
+    def complete(self, request, pk):
+        upload = get_object_or_404(VideoUpload, pk=pk)
+        try:
+            name = complete_upload(upload)
+        except UploadError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"message": "success", "video": name}, status=status.HTTP_200_OK)
+
+
+class MediaView(viewsets.ViewSet):
+    """Lesson and homework files for the people they belong to, see serve_file."""
+    permission_classes = [IsAuthenticated]
+    LESSON_FIELDS = ('video', 'task_file')
+
+    def is_staff(self, request):
+        return AdminEnterPermission().has_permission(request, self)
+
+    def lesson(self, request, pk, field):
+        if field not in self.LESSON_FIELDS:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        lesson = get_object_or_404(Lesson.objects.only('id', 'group_id', field), pk=pk)
+        if not self.is_staff(request) and not StudentGroup.objects.filter(
+            group_id=lesson.group_id, student__user_id=request.user.id, status='active'
+        ).exists():
+            return Response({"detail": "You are not in this lesson's group!"}, status=status.HTTP_403_FORBIDDEN)
+
+        file = getattr(lesson, field)
+        if not file:
+            return Response({"detail": "This lesson has no such file!"}, status=status.HTTP_404_NOT_FOUND)
+        return serve_file(request, file)
+
+    def homework(self, request, pk):
+        homework = get_object_or_404(Homework.objects.select_related('student').only('file', 'student__user_id'), pk=pk)
+        if homework.student.user_id != request.user.id and not self.is_staff(request):
+            return Response({"detail": "This is not your homework!"}, status=status.HTTP_403_FORBIDDEN)
+
+        if not homework.file:
+            return Response({"detail": "This homework has no file!"}, status=status.HTTP_404_NOT_FOUND)
+        return serve_file(request, homework.file)